@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class AdaptivePolicy:
+    """Picks each target's next check delay from what its checks have seen
+
+    Any target whose check fails backs off exponentially, with jitter so a
+    retailer outage doesn't bring every target back at the same moment. Targets
+    in adaptive mode also check faster around the time of day the item has
+    restocked before and slower the longer nothing about it has changed,
+    always within their bounds. Every check is counted against what the fixed
+    interval would have cost over the same stretch, so the savings can be
+    reported.
+    """
+
+    def __init__(self, backoff_max: float = 3600, tighten_factor: float = 4, restock_window_hours: int = 1,
+                 relax_after: float = 86400, relax_max_factor: float = 16):
+        self.backoff_max = backoff_max
+        self.tighten_factor = tighten_factor
+        self.restock_window_hours = restock_window_hours
+        self.relax_after = relax_after
+        self.relax_max_factor = relax_max_factor
+        self._lock = threading.Lock()
+        self._targets: Dict[Hashable, Dict] = {}
+        self.checks = 0
+        self.baseline_checks = 0.0
+        self.modes = {'fixed': 0, 'tightened': 0, 'relaxed': 0, 'backoff': 0, 'paused': 0}
+
+    def _state(self, key: Hashable) -> Dict:
+        state = self._targets.get(key)
+        if state is None:
+            state = self._targets[key] = {
+                'failures': 0, 'seen': None, 'last_change': time.time(), 'restock_hours': set()
+            }
+        return state
+
+    def record_restock(self, key: Hashable, when: datetime):
+        with self._lock:
+            self._state(key)['restock_hours'].add(when.hour)
+
+    def forget(self, key: Hashable):
+        with self._lock:
+            self._targets.pop(key, None)
+
+    def _near_restock(self, state: Dict, hour: int) -> bool:
+        window = self.restock_window_hours
+        return any(min((hour - past) % 24, (past - hour) % 24) <= window for past in state['restock_hours'])
+
+    def next_delay(self, key: Hashable, result: Dict, interval: float,
+                   bounds: Optional[Tuple[float, float]] = None) -> float:
+        """Seconds until the target's next check, given the result of this one
+
+        `bounds` is the (min, max) an adaptive target may range over; None keeps
+        the fixed interval apart from error backoff.
+        """
+        now = time.time()
+        with self._lock:
+            state = self._state(key)
+
+            if result.get('circuit_open'):
+                # Nothing was sent; come back once the retailer's breaker may let us through,
+                # spread out so the targets don't all queue up for the same probe
+                delay, mode = result['retry_after'] + random.uniform(0, min(interval, 60)), 'paused'
+            elif result.get('error'):
+                state['failures'] += 1
+                # Jittered, but never sooner than a normal check would come round
+                ceiling = max(interval, min(self.backoff_max, interval * 2 ** state['failures']))
+                delay, mode = max(interval, random.uniform(ceiling / 2, ceiling)), 'backoff'
+            else:
+                state['failures'] = 0
+                seen = (result.get('in_stock', False), result.get('price'))
+                if seen != state['seen']:
+                    if state['seen'] is not None and seen[0] and not state['seen'][0]:
+                        state['restock_hours'].add(datetime.now().hour)
+                    state['seen'] = seen
+                    state['last_change'] = now
+
+                delay, mode = interval, 'fixed'
+                if bounds is not None:
+                    idle_periods = int((now - state['last_change']) // self.relax_after)
+                    if self._near_restock(state, datetime.now().hour):
+                        delay, mode = interval / self.tighten_factor, 'tightened'
+                    elif idle_periods:
+                        delay, mode = interval * min(self.relax_max_factor, 2 ** idle_periods), 'relaxed'
+                    delay = min(max(delay, bounds[0]), bounds[1])
+
+            if mode != 'paused':
+                self.checks += 1
+            # What a fixed schedule would have spent over the same stretch
+            self.baseline_checks += delay / interval
+            self.modes[mode] += 1
+            return delay
+
+    def stats(self) -> Dict:
+        with self._lock:
+            saved = self.baseline_checks - self.checks
+            return {
+                'targets': len(self._targets),
+                'backing_off': sum(1 for state in self._targets.values() if state['failures']),
+                'checks': self.checks,
+                'fixed_schedule_checks': round(self.baseline_checks, 1),
+                'requests_saved': round(saved, 1),
+                'savings_pct': round(100 * saved / self.baseline_checks, 1) if self.baseline_checks else 0.0,
+                'modes': dict(self.modes)
+            }
@@ -1,21 +1,44 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from datetime import datetime
-import requests
 import threading
 import time
 import json
-from typing import Dict, List, Optional
+import math
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import concurrent.futures
+import functools
 import os
-import re
-from bs4 import BeautifulSoup
+import atexit
 import random
+from scheduler import CheckScheduler, chain_future
+from inventory import InventoryMonitor, RETAILERS, batch_config, can_batch
+from batch import BatchCollector
+from stores import default_store_locator, normalize_zip
+from breaker import RetailerBreakers
+from coalescer import CheckCoalescer
+from ratelimit import RetailerRateLimiter, load_rate_limits
+from jobs import JobRegistry
+from events import EventBus
+from itemstore import ItemStore
+from storage import MonitorDatabase
+from history import PriceHistory
+from notifications import NotificationLog
+from leader import LeaderLease
+from adaptive import AdaptivePolicy
+from resultcache import ResultCache
+from metrics import Counter, Gauge, render as render_metrics
+from delivery import WebhookDispatcher
+from bulk import FORMATS, export_lines, format_for, parse_flag, parse_row, read_rows, row_key
 
 app = Flask(__name__)
 
 # In-memory storage for monitored items
-monitored_items = []
-item_id_counter = 0
-notification_history = []
+monitored_items = ItemStore()
+
+# How many notifications are kept, newest first
+NOTIFICATION_HISTORY = int(os.environ.get('NOTIFICATION_HISTORY', 500))
+notification_history = NotificationLog(NOTIFICATION_HISTORY)
 
 # Check intervals in seconds
 CHECK_INTERVALS = {
@@ -30,596 +53,592 @@ CHECK_INTERVALS = {
     'daily': 86400
 }
 
-# Store active monitoring threads
-monitoring_threads = {}
+# Failed checks back off exponentially (with jitter) up to BACKOFF_MAX seconds.
+# Monitors in adaptive mode speed up around past restock times and slow down
+# while nothing changes, between their own min/max intervals (these by default)
+BACKOFF_MAX = float(os.environ.get('BACKOFF_MAX', 3600))
+ADAPTIVE_MIN_INTERVAL = os.environ.get('ADAPTIVE_MIN_INTERVAL', '30s')
+ADAPTIVE_MAX_INTERVAL = os.environ.get('ADAPTIVE_MAX_INTERVAL', '1h')
+
+# Size of the shared worker pool that runs scheduled checks
+CHECK_WORKERS = int(os.environ.get('CHECK_WORKERS', 8))
+
+# Manual check-all: how many targets are fetched at once, and how long one call may
+# run before it returns what finished (kept under gunicorn's 30 s worker timeout)
+CHECK_ALL_WORKERS = int(os.environ.get('CHECK_ALL_WORKERS', 16))
+CHECK_ALL_BUDGET = float(os.environ.get('CHECK_ALL_BUDGET', 25))
+CHECK_ALL_JOB_BUDGET = float(os.environ.get('CHECK_ALL_JOB_BUDGET', 300))
+
+# Fetch backend: 'sync' (requests) or 'async' (aiohttp on one event loop)
+FETCH_BACKEND = os.environ.get('FETCH_BACKEND', 'sync')
+
+# Max open connections per retailer host for the async backend
+FETCH_LIMIT_PER_HOST = int(os.environ.get('FETCH_LIMIT_PER_HOST', 4))
+
+# Read product pages in chunks and stop once stock and price are known
+STREAM_PAGES = os.environ.get('STREAM_PAGES', '0') == '1'
+
+# SQLite file monitors and notifications are saved to (empty to keep them in memory
+# only); status updates are written in batches every DATABASE_FLUSH_INTERVAL seconds
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'inventory_monitor.db')
+DATABASE_FLUSH_INTERVAL = float(os.environ.get('DATABASE_FLUSH_INTERVAL', 1))
+
+# Several gunicorn workers can share DATABASE_PATH: one of them, elected through a
+# lock file next to the database, runs the checks, and every worker replays the
+# others' changes from the database every SHARED_SYNC_INTERVAL seconds
+SHARED_STATE = os.environ.get('SHARED_STATE', '0') == '1'
+SHARED_SYNC_INTERVAL = float(os.environ.get('SHARED_SYNC_INTERVAL', 1))
+
+# After a restart, monitors that are overdue get their first check spread over
+# their interval, but never further out than this many seconds
+WARM_START_SPREAD = float(os.environ.get('WARM_START_SPREAD', 600))
+
+# Manual checks reuse a target's result up to RESULT_CACHE_TTL seconds old unless
+# ?force=1 (callers can pick their own ?max_age); RESULT_CACHE_SIZE targets are kept
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 30))
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 10000))
+
+# Retailers with a multi-item lookup (Best Buy, given BESTBUY_API_KEY) check online
+# monitors in batches: checks arriving within BATCH_WINDOW seconds share a request,
+# and scheduled targets due within BATCH_PULL_AHEAD of their interval join it early
+BATCH_WINDOW = float(os.environ.get('BATCH_WINDOW', 0.25))
+BATCH_PULL_AHEAD = float(os.environ.get('BATCH_PULL_AHEAD', 0.5))
+
+# Restock notifications are also POSTed as JSON ({"notifications": [...]}) to each of
+# the comma-separated WEBHOOK_URLS by WEBHOOK_WORKERS threads. Up to WEBHOOK_BATCH_SIZE
+# notifications share a request, waiting at most WEBHOOK_BATCH_WAIT seconds to fill;
+# failed requests are retried with backoff up to WEBHOOK_MAX_ATTEMPTS times. Each URL
+# queues at most WEBHOOK_QUEUE_SIZE notifications, and a target's restock raised again
+# within WEBHOOK_DEDUPE_WINDOW seconds is not sent twice
+WEBHOOK_URLS = [url.strip() for url in os.environ.get('WEBHOOK_URLS', '').split(',') if url.strip()]
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 2))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 1000))
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 20))
+WEBHOOK_BATCH_WAIT = float(os.environ.get('WEBHOOK_BATCH_WAIT', 1))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 5))
+WEBHOOK_DEDUPE_WINDOW = float(os.environ.get('WEBHOOK_DEDUPE_WINDOW', 600))
+
+# Bulk imports take at most IMPORT_MAX_ROWS rows, and spread the first checks of
+# the pages they add over their interval, but never further out than IMPORT_SPREAD seconds
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 50000))
+IMPORT_SPREAD = float(os.environ.get('IMPORT_SPREAD', 600))
+
+# Price/stock samples kept per item (13 bytes each; 100000 is about a month of
+# 30-second checks), and roughly how many buckets a history query returns by default
+HISTORY_SAMPLES = int(os.environ.get('HISTORY_SAMPLES', 100000))
+HISTORY_BUCKETS = int(os.environ.get('HISTORY_BUCKETS', 200))
+
+# Per-retailer request budgets shared by every check, e.g.
+# RATE_LIMITS='{"Walmart": {"rate": 0.2, "burst": 2}}' (rate is requests per second)
+rate_limiter = RetailerRateLimiter(load_rate_limits(os.environ.get('RATE_LIMITS')))
+
+# A retailer's checks all pause once BREAKER_THRESHOLD of at least BREAKER_MIN_REQUESTS
+# requests in the last BREAKER_WINDOW seconds were 403/429/5xx or got no answer;
+# probes go out after BREAKER_COOLDOWN seconds, doubling (up to 15 min) while they fail
+retailer_breakers = RetailerBreakers(
+    RETAILERS,
+    threshold=float(os.environ.get('BREAKER_THRESHOLD', 0.5)),
+    min_requests=int(os.environ.get('BREAKER_MIN_REQUESTS', 5)),
+    window=float(os.environ.get('BREAKER_WINDOW', 60)),
+    cooldown=float(os.environ.get('BREAKER_COOLDOWN', 60))
+)
+
+# Initialize monitor
+if FETCH_BACKEND == 'async':
+    from async_inventory import AsyncInventoryMonitor
+    inventory_monitor = AsyncInventoryMonitor(rate_limiter, STREAM_PAGES, limit_per_host=FETCH_LIMIT_PER_HOST,
+                                              breakers=retailer_breakers)
+    atexit.register(inventory_monitor.close)
+else:
+    inventory_monitor = InventoryMonitor(rate_limiter, STREAM_PAGES, retailer_breakers)
+
+def get_interval_seconds(interval: str) -> int:
+    """Resolve a check interval id to seconds"""
+    return CHECK_INTERVALS.get(interval, 120)
+
+def find_item(item_id: int) -> Optional[Dict]:
+    """Look up a monitored item by id"""
+    return monitored_items.get(item_id)
+
+def target_key(item: Dict) -> Tuple[str, str, Optional[str]]:
+    """Identity of the page a monitor watches; monitors sharing it share one fetch"""
+    return (item['retailer'], str(item['item_id']), item.get('store_id') or None)
 
-# User agent to avoid being blocked
-USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+def target_watchers(key: Tuple) -> List[int]:
+    """Ids of the monitored items watching a target"""
+    with targets_lock:
+        return sorted(watchers_by_target.get(key, ()))
 
-class InventoryMonitor:
-    """Handles inventory checking for multiple retailers via web scraping"""
+def target_interval(key: Tuple) -> Optional[int]:
+    """Shortest check interval among a target's watchers"""
+    intervals = [get_interval_seconds(item['check_interval'])
+                 for item in monitored_items.get_many(target_watchers(key))]
+    return min(intervals) if intervals else None
+
+def target_bounds(key: Tuple) -> Optional[Tuple[int, int]]:
+    """(min, max) seconds an adaptive target's interval may range over, or None if any watcher wants it fixed"""
+    watchers = monitored_items.get_many(target_watchers(key))
+    if not watchers or not all(item.get('adaptive') for item in watchers):
+        return None
     
-    def __init__(self):
-        self.last_check_times = {}
-        self.previous_stock = {}
-        self.session = requests.Session()
-        self.session.headers.update({'User-Agent': USER_AGENT})
+    interval = min(get_interval_seconds(item['check_interval']) for item in watchers)
+    low = min(get_interval_seconds(item.get('min_interval') or ADAPTIVE_MIN_INTERVAL) for item in watchers)
+    high = min(get_interval_seconds(item.get('max_interval') or ADAPTIVE_MAX_INTERVAL) for item in watchers)
+    # The chosen interval is always within bounds
+    return min(low, interval), max(high, interval)
+
+def next_check_delay(key: Tuple, result: Dict) -> Optional[float]:
+    """Seconds until a target's next scheduled check"""
+    interval = target_interval(key)
+    if interval is None:
+        return None
+    return adaptive_policy.next_delay(key, result, interval, target_bounds(key))
+
+def watch_target(item: Dict, spread: float = 0.0):
+    """Attach a monitored item to its target, scheduling the target if it is new
+
+    A new target's first check runs right away, or at a random point within
+    `spread` seconds (capped at its interval), then every check_interval.
+    """
+    key = target_key(item)
+    with targets_lock:
+        is_new = key not in watchers_by_target
+        watchers_by_target.setdefault(key, set()).add(item['id'])
     
-    def check_target_inventory(self, tcin: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
-        """Scrape Target product page for inventory"""
-        try:
-            url = f'https://www.target.com/p/A-{tcin}'
-            
-            headers = {
-                'User-Agent': USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=15)
-            
-            if response.status_code == 404:
-                return {
-                    'retailer': 'Target',
-                    'item_id': tcin,
-                    'in_stock': False,
-                    'quantity': 0,
-                    'error': 'Product not found',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            response.raise_for_status()
-            html = response.text
-            
-            # Look for stock status in the HTML
-            in_stock = False
-            quantity = 0
-            price = 0.0
-            
-            # Check for out of stock indicators
-            out_of_stock_phrases = [
-                'out of stock',
-                'currently unavailable',
-                'not available',
-                'sold out',
-                'Out of stock'
-            ]
-            
-            # Check for in stock indicators
-            in_stock_phrases = [
-                'add to cart',
-                'Add to cart',
-                'in stock',
-                'In stock',
-                'Available',
-                'available'
-            ]
-            
-            html_lower = html.lower()
-            
-            # Check if product is out of stock
-            is_out_of_stock = any(phrase.lower() in html_lower for phrase in out_of_stock_phrases)
-            
-            # Check if product is in stock
-            has_add_to_cart = any(phrase.lower() in html_lower for phrase in in_stock_phrases)
-            
-            if not is_out_of_stock and has_add_to_cart:
-                in_stock = True
-                quantity = 1  # Target doesn't usually show exact quantity
-            
-            # Try to extract price
-            price_patterns = [
-                r'\$(\d+\.\d{2})',
-                r'"price":(\d+\.\d{2})',
-                r'price&quot;:(\d+\.\d{2})'
-            ]
-            
-            for pattern in price_patterns:
-                price_match = re.search(pattern, html)
-                if price_match:
-                    try:
-                        price = float(price_match.group(1))
-                        break
-                    except:
-                        pass
-            
-            return {
-                'retailer': 'Target',
-                'item_id': tcin,
-                'in_stock': in_stock,
-                'quantity': quantity if in_stock else 0,
-                'store_id': store_id,
-                'location_type': 'store' if store_id else 'online',
-                'timestamp': datetime.now().isoformat(),
-                'price': price if price > 0 else None
-            }
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Target scraping error for {tcin}: {e}")
-            return {
-                'retailer': 'Target',
-                'item_id': tcin,
-                'in_stock': False,
-                'quantity': 0,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def check_walmart_inventory(self, item_id: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
-        """Scrape Walmart product page for inventory"""
-        try:
-            # Walmart uses different URL formats
-            url = f'https://www.walmart.com/ip/{item_id}'
-            
-            headers = {
-                'User-Agent': USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=15)
-            
-            if response.status_code == 404:
-                return {
-                    'retailer': 'Walmart',
-                    'item_id': item_id,
-                    'in_stock': False,
-                    'quantity': 0,
-                    'error': 'Product not found',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            response.raise_for_status()
-            html = response.text
-            
-            in_stock = False
-            quantity = 0
-            price = 0.0
-            
-            # Walmart indicators
-            out_of_stock_phrases = [
-                'out of stock',
-                'not available',
-                'sold out',
-                'Get in-stock alert'
-            ]
-            
-            in_stock_phrases = [
-                'add to cart',
-                'Add to cart',
-                'in stock',
-                'Add to list'
-            ]
-            
-            html_lower = html.lower()
-            
-            is_out_of_stock = any(phrase.lower() in html_lower for phrase in out_of_stock_phrases)
-            has_add_to_cart = any(phrase.lower() in html_lower for phrase in in_stock_phrases)
-            
-            if not is_out_of_stock and has_add_to_cart:
-                in_stock = True
-                quantity = 1
-            
-            # Extract price
-            price_patterns = [
-                r'\$(\d+\.\d{2})',
-                r'"price":"(\d+\.\d{2})"',
-                r'price&quot;:&quot;(\d+\.\d{2})'
-            ]
-            
-            for pattern in price_patterns:
-                price_match = re.search(pattern, html)
-                if price_match:
-                    try:
-                        price = float(price_match.group(1))
-                        break
-                    except:
-                        pass
-            
-            return {
-                'retailer': 'Walmart',
-                'item_id': item_id,
-                'in_stock': in_stock,
-                'quantity': quantity if in_stock else 0,
-                'store_id': store_id,
-                'location_type': 'store' if store_id else 'online',
-                'timestamp': datetime.now().isoformat(),
-                'price': price if price > 0 else None
-            }
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Walmart scraping error for {item_id}: {e}")
-            return {
-                'retailer': 'Walmart',
-                'item_id': item_id,
-                'in_stock': False,
-                'quantity': 0,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def check_bestbuy_inventory(self, sku: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
-        """Scrape Best Buy product page for inventory"""
-        try:
-            # Best Buy URL format
-            url = f'https://www.bestbuy.com/site/{sku}.p?skuId={sku}'
-            
-            headers = {
-                'User-Agent': USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=15)
-            
-            if response.status_code == 404:
-                return {
-                    'retailer': 'Best Buy',
-                    'item_id': sku,
-                    'in_stock': False,
-                    'quantity': 0,
-                    'error': 'Product not found',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            response.raise_for_status()
-            html = response.text
-            
-            in_stock = False
-            quantity = 0
-            price = 0.0
-            
-            # Best Buy indicators
-            out_of_stock_phrases = [
-                'sold out',
-                'coming soon',
-                'unavailable nearby'
-            ]
-            
-            in_stock_phrases = [
-                'add to cart',
-                'Add to Cart',
-                'in stock',
-                'available'
-            ]
-            
-            html_lower = html.lower()
-            
-            is_out_of_stock = any(phrase.lower() in html_lower for phrase in out_of_stock_phrases)
-            has_add_to_cart = any(phrase.lower() in html_lower for phrase in in_stock_phrases)
-            
-            if not is_out_of_stock and has_add_to_cart:
-                in_stock = True
-                quantity = 1
-            
-            # Extract price
-            price_patterns = [
-                r'\$(\d+\.\d{2})',
-                r'"price":(\d+\.\d{2})',
-            ]
-            
-            for pattern in price_patterns:
-                price_match = re.search(pattern, html)
-                if price_match:
-                    try:
-                        price = float(price_match.group(1))
-                        break
-                    except:
-                        pass
-            
-            return {
-                'retailer': 'Best Buy',
-                'item_id': sku,
-                'in_stock': in_stock,
-                'quantity': quantity if in_stock else 0,
-                'store_id': store_id,
-                'location_type': 'store' if store_id else 'online',
-                'timestamp': datetime.now().isoformat(),
-                'price': price if price > 0 else None
-            }
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Best Buy scraping error for {sku}: {e}")
-            return {
-                'retailer': 'Best Buy',
-                'item_id': sku,
-                'in_stock': False,
-                'quantity': 0,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def check_sams_inventory(self, item_id: str, club_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
-        """Scrape Sam's Club product page for inventory"""
-        try:
-            url = f'https://www.samsclub.com/p/{item_id}'
-            
-            headers = {
-                'User-Agent': USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=15)
-            
-            if response.status_code == 404:
-                return {
-                    'retailer': "Sam's Club",
-                    'item_id': item_id,
-                    'in_stock': False,
-                    'quantity': 0,
-                    'error': 'Product not found',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            response.raise_for_status()
-            html = response.text
-            
-            in_stock = False
-            quantity = 0
-            price = 0.0
-            
-            out_of_stock_phrases = [
-                'out of stock',
-                'not available',
-                'sold out'
-            ]
-            
-            in_stock_phrases = [
-                'add to cart',
-                'Add to cart',
-                'in stock'
-            ]
-            
-            html_lower = html.lower()
-            
-            is_out_of_stock = any(phrase.lower() in html_lower for phrase in out_of_stock_phrases)
-            has_add_to_cart = any(phrase.lower() in html_lower for phrase in in_stock_phrases)
-            
-            if not is_out_of_stock and has_add_to_cart:
-                in_stock = True
-                quantity = 1
-            
-            # Extract price
-            price_patterns = [
-                r'\$(\d+\.\d{2})',
-                r'"price":"(\d+\.\d{2})"',
-            ]
-            
-            for pattern in price_patterns:
-                price_match = re.search(pattern, html)
-                if price_match:
-                    try:
-                        price = float(price_match.group(1))
-                        break
-                    except:
-                        pass
-            
-            return {
-                'retailer': "Sam's Club",
-                'item_id': item_id,
-                'in_stock': in_stock,
-                'quantity': quantity if in_stock else 0,
-                'store_id': club_id,
-                'location_type': 'club' if club_id else 'online',
-                'timestamp': datetime.now().isoformat(),
-                'price': price if price > 0 else None
-            }
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Sam's Club scraping error for {item_id}: {e}")
-            return {
-                'retailer': "Sam's Club",
-                'item_id': item_id,
-                'in_stock': False,
-                'quantity': 0,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def check_gamestop_inventory(self, sku: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
-        """Scrape GameStop product page for inventory"""
-        try:
-            # GameStop URL format
-            url = f'https://www.gamestop.com/product/{sku}'
-            
-            headers = {
-                'User-Agent': USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=15)
-            
-            if response.status_code == 404:
-                return {
-                    'retailer': 'GameStop',
-                    'item_id': sku,
-                    'in_stock': False,
-                    'quantity': 0,
-                    'error': 'Product not found',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            response.raise_for_status()
-            html = response.text
-            
-            in_stock = False
-            quantity = 0
-            price = 0.0
-            
-            out_of_stock_phrases = [
-                'not available',
-                'unavailable',
-                'out of stock'
-            ]
-            
-            in_stock_phrases = [
-                'add to cart',
-                'Add to Cart',
-                'in stock',
-                'available'
-            ]
-            
-            html_lower = html.lower()
-            
-            is_out_of_stock = any(phrase.lower() in html_lower for phrase in out_of_stock_phrases)
-            has_add_to_cart = any(phrase.lower() in html_lower for phrase in in_stock_phrases)
-            
-            if not is_out_of_stock and has_add_to_cart:
-                in_stock = True
-                quantity = 1
-            
-            # Extract price
-            price_patterns = [
-                r'\$(\d+\.\d{2})',
-                r'"price":"(\d+\.\d{2})"',
-            ]
-            
-            for pattern in price_patterns:
-                price_match = re.search(pattern, html)
-                if price_match:
-                    try:
-                        price = float(price_match.group(1))
-                        break
-                    except:
-                        pass
-            
-            return {
-                'retailer': 'GameStop',
-                'item_id': sku,
-                'in_stock': in_stock,
-                'quantity': quantity if in_stock else 0,
-                'store_id': store_id,
-                'location_type': 'store' if store_id else 'online',
-                'timestamp': datetime.now().isoformat(),
-                'price': price if price > 0 else None
-            }
-            
-        except requests.exceptions.RequestException as e:
-            print(f"GameStop scraping error for {sku}: {e}")
-            return {
-                'retailer': 'GameStop',
-                'item_id': sku,
-                'in_stock': False,
-                'quantity': 0,
-                'error': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-    
-    def check_inventory(self, item_config: Dict) -> Dict:
-        """Check inventory based on retailer"""
-        retailer = item_config['retailer']
-        item_id = item_config['item_id']
-        store_id = item_config.get('store_id')
-        zip_code = item_config.get('zip_code')
-        
-        # Add delay to avoid rate limiting
-        time.sleep(random.uniform(1, 3))
-        
-        if retailer == 'Target':
-            return self.check_target_inventory(item_id, store_id, zip_code)
-        elif retailer == 'Walmart':
-            return self.check_walmart_inventory(item_id, store_id, zip_code)
-        elif retailer == 'Best Buy':
-            return self.check_bestbuy_inventory(item_id, store_id, zip_code)
-        elif retailer == "Sam's Club":
-            return self.check_sams_inventory(item_id, store_id, zip_code)
-        elif retailer == 'GameStop':
-            return self.check_gamestop_inventory(item_id, store_id, zip_code)
-        else:
-            return {'error': f'Unknown retailer: {retailer}'}
+    if is_new:
+        interval = get_interval_seconds(item['check_interval'])
+        check_scheduler.schedule(key, interval, random.uniform(0, min(interval, spread)))
+    else:
+        check_scheduler.reschedule(key, target_interval(key))
+
+def unwatch_target(item: Dict):
+    """Detach a monitored item, unscheduling its target once nobody watches it"""
+    key = target_key(item)
+    with targets_lock:
+        watchers = watchers_by_target.get(key, set())
+        watchers.discard(item['id'])
+        if not watchers:
+            watchers_by_target.pop(key, None)
     
-    def find_nearby_stores(self, retailer: str, zip_code: str, radius: int) -> List[Dict]:
-        """Find stores near a zip code - mock data for now"""
-        # Store locator scraping would be complex and site-specific
-        # Using mock data for store locations
-        mock_stores = []
-        
-        if retailer == 'Target':
-            mock_stores = [
-                {'store_id': 'T1234', 'name': 'Target Store #1234', 'address': '123 Main St', 'distance': 2.5},
-                {'store_id': 'T5678', 'name': 'Target Store #5678', 'address': '456 Oak Ave', 'distance': 5.8},
-                {'store_id': 'T9012', 'name': 'Target Store #9012', 'address': '789 Pine Rd', 'distance': 8.2}
-            ]
-        elif retailer == 'Walmart':
-            mock_stores = [
-                {'store_id': 'W2345', 'name': 'Walmart Supercenter #2345', 'address': '234 Commerce Dr', 'distance': 3.1},
-                {'store_id': 'W6789', 'name': 'Walmart Supercenter #6789', 'address': '567 Market St', 'distance': 7.4}
-            ]
-        elif retailer == 'Best Buy':
-            mock_stores = [
-                {'store_id': 'BB123', 'name': 'Best Buy #123', 'address': '345 Tech Plaza', 'distance': 4.2},
-                {'store_id': 'BB456', 'name': 'Best Buy #456', 'address': '678 Electronics Way', 'distance': 9.5}
-            ]
-        elif retailer == "Sam's Club":
-            mock_stores = [
-                {'store_id': 'SC789', 'name': "Sam's Club #789", 'address': '890 Warehouse Blvd', 'distance': 6.3}
-            ]
-        elif retailer == 'GameStop':
-            mock_stores = [
-                {'store_id': 'GS111', 'name': 'GameStop #111', 'address': '111 Mall Dr', 'distance': 1.8},
-                {'store_id': 'GS222', 'name': 'GameStop #222', 'address': '222 Plaza Circle', 'distance': 4.7},
-                {'store_id': 'GS333', 'name': 'GameStop #333', 'address': '333 Shopping Center', 'distance': 8.9}
-            ]
+    interval = target_interval(key)
+    if interval is None:
+        check_scheduler.unschedule(key)
+        adaptive_policy.forget(key)
+        result_cache.forget(key)
+    else:
+        check_scheduler.reschedule(key, interval)
+
+def is_batchable(key: Tuple) -> bool:
+    """Whether a target is checked through its retailer's multi-item lookup"""
+    return can_batch(*key)
+
+def fetch_inventory(item: Dict) -> Dict:
+    """Fetch a target's current state and cache it for later manual checks"""
+    key = target_key(item)
+    if is_batchable(key):
+        result = batch_collector.submit(item).result()
+    else:
+        result = inventory_monitor.check_inventory(item)
+    result_cache.put(key, result)
+    return result
+
+def submit_inventory(item: Dict) -> Future:
+    """fetch_inventory() on the async backend's event loop"""
+    key = target_key(item)
+    
+    def remember(result: Dict) -> Dict:
+        result_cache.put(key, result)
+        return result
+    
+    if is_batchable(key):
+        return chain_future(batch_collector.submit(item), remember)
+    return chain_future(inventory_monitor.submit(item), remember)
+
+def run_batch(retailer: str, item_ids: List[str]) -> Dict[str, Dict]:
+    """One multi-item lookup for the batch collector"""
+    return inventory_monitor.check_batch(retailer, item_ids)
+
+def batch_size(retailer: str) -> int:
+    return batch_config(retailer)['max_items']
+
+def pull_ahead_targets(retailer: str, room: int) -> List[Tuple[Dict, Future]]:
+    """Scheduled targets of a retailer due soon, claimed from the scheduler to fill a batch"""
+    keys = check_scheduler.take_due(BATCH_PULL_AHEAD, lambda key: key[0] == retailer and is_batchable(key), room)
+    riders = []
+    for key in keys:
+        watchers = target_watchers(key)
+        item = find_item(watchers[0]) if watchers else None
+        if item is None:
+            check_scheduler.finish(key)
+            continue
+        future = Future()
+        future.add_done_callback(functools.partial(finish_pulled_check, key))
+        riders.append((item, future))
+    return riders
+
+def finish_pulled_check(key: Tuple, future: Future):
+    """Apply a result that arrived in another target's batch, as its scheduled check would have"""
+    error = future.exception()
+    if error is not None:
+        check_scheduler.finish(key, error)
+        return
+    result = future.result()
+    result_cache.put(key, result)
+    check_scheduler.finish(key, None, fan_out_result(key, result, 0.0))
+
+def fan_out_result(key: Tuple, result: Dict, lag: float) -> Optional[float]:
+    """Apply a scheduled check's result to every watcher of its target; returns the next check's delay"""
+    for item_id in target_watchers(key):
+        apply_check_result(item_id, result, lag)
+    return next_check_delay(key, result)
+
+def check_target(item: Dict, max_age: float = 0) -> Dict:
+    """Check a monitor's target, unless a result at most `max_age` seconds old is cached
+
+    A fetch joins an identical check that is already in flight.
+    """
+    key = target_key(item)
+    if max_age > 0:
+        cached = result_cache.get(key, max_age)
+        if cached is not None:
+            return cached
+    if FETCH_BACKEND == 'async':
+        return check_coalescer.submit(key, lambda: submit_inventory(item)).result()
+    return check_coalescer.run(key, lambda: fetch_inventory(item))
+
+def catch_up_watchers(key: Tuple, result: Dict) -> List[Dict]:
+    """Give a cached result to the target's watchers that haven't seen it, e.g. one added since; returns every watcher"""
+    watchers = []
+    for item in monitored_items.get_many(target_watchers(key)):
+        if (item.get('last_check') or '') < result['checked_at']:
+            changed = update_item_status(item['id'], result, last_check=result['checked_at'])
+            item = changed[1] if changed else item
+        watchers.append(item)
+    return watchers
+
+def run_scheduled_check(key: Tuple, lag: float):
+    """Check one target for all of its watchers; called by the scheduler's worker pool"""
+    watchers = target_watchers(key)
+    item = find_item(watchers[0]) if watchers else None
+    if item is None:
+        return None
+    
+    fan_out = functools.partial(fan_out_result, key, lag=lag)
+    
+    if FETCH_BACKEND == 'async':
+        # Hand the fetch to the event loop so the worker is free while it's in flight
+        return chain_future(check_coalescer.submit(key, lambda: submit_inventory(item)), fan_out)
+    
+    # Check inventory
+    return fan_out(check_coalescer.run(key, lambda: fetch_inventory(item)))
+
+def summary_stats() -> Dict:
+    """Item and notification counts shown on the dashboard"""
+    return dict(monitored_items.counts(), total_notifications=len(notification_history))
+
+def publish_stats():
+    """Push the dashboard counters that changed since the last push"""
+    with stats_publish_lock:
+        stats = summary_stats()
+        delta = {key: value for key, value in stats.items() if published_stats.get(key) != value}
+        if delta:
+            published_stats.update(delta)
+            event_bus.publish('stats', delta)
+
+def push_item(item: Dict):
+    """Push an item's new state to open dashboards"""
+    # The epoch tells the dashboard which worker's versions it can compare
+    event_bus.publish('item', dict(item, epoch=monitored_items.epoch))
+    publish_stats()
+
+def publish_item(item: Dict):
+    """Save an item's new state and push it to open dashboards"""
+    if database is not None:
+        database.save_item(item)
+    push_item(item)
+
+# What changes on every check whether or not anything a monitor shows did
+QUIET_FIELDS = {'last_check', 'check_lag', 'parse_path', 'version'}
+
+def push_change(previous: Optional[Dict], item: Dict):
+    """Push an item to open dashboards now, or with the next batch of check times if only those changed"""
+    if previous is None or any(previous.get(key) != item.get(key) for key in (previous.keys() | item.keys()) - QUIET_FIELDS):
+        push_item(item)
+        return
+    with checked_lock:
+        checked_since_push[item['id']] = {'id': item['id'], 'last_check': item.get('last_check'), 'version': item['version']}
+
+def push_checked_loop():
+    """Every CHECKED_PUSH_INTERVAL seconds, push the check times of items whose checks changed nothing else"""
+    while True:
+        time.sleep(CHECKED_PUSH_INTERVAL)
+        with checked_lock:
+            checked = list(checked_since_push.values())
+            checked_since_push.clear()
+        if checked:
+            event_bus.publish('checked', {'epoch': monitored_items.epoch, 'items': checked})
+
+# Fields set by checks rather than by editing a monitor
+STATUS_FIELDS = ('last_check', 'in_stock', 'current_quantity', 'price', 'parse_path', 'last_error', 'check_lag')
+
+def status_changes(result: Dict) -> Dict:
+    """Fields a check result sets on a monitored item"""
+    return {
+        'last_check': datetime.now().isoformat(),
+        'in_stock': result.get('in_stock', False),
+        'current_quantity': result.get('quantity', 0),
+        'price': result.get('price'),
+        'parse_path': result.get('parse_path'),
+        # Store any errors
+        'last_error': result.get('error')
+    }
+
+def update_item_status(item_id: int, result: Dict, **extra) -> Optional[Tuple[Dict, Dict]]:
+    """Copy a check result onto a monitored item; (previous, updated), or None if it was removed"""
+    changed = monitored_items.update(item_id, dict(status_changes(result), **extra))
+    if changed is not None:
+        price_history.record(item_id, time.time(), changed[1]['price'], changed[1]['in_stock'])
+        if database is not None:
+            database.save_item(changed[1])
+        push_change(*changed)
+    return changed
+
+def apply_check_result(item_id: int, result: Dict, lag: float):
+    """Record a scheduled check's result and raise a notification on restock"""
+    # The item may have been removed while the check was in flight
+    changed = update_item_status(item_id, result, check_lag=round(lag, 3))
+    if changed is None:
+        return
+    
+    previous, monitored = changed
+    previous_quantity = previous.get('current_quantity', 0)
+    current_quantity = result.get('quantity', 0)
+    
+    # Detect stock changes (0 to any positive number)
+    if previous_quantity == 0 and current_quantity > 0:
+        notification = notification_history.add({
+            'timestamp': datetime.now().isoformat(),
+            'monitor_id': monitored['id'],
+            'item_name': monitored['item_name'],
+            'retailer': monitored['retailer'],
+            'quantity': current_quantity,
+            'location_type': monitored.get('location_type', 'online'),
+            'store_id': monitored.get('store_id'),
+            'price': monitored.get('price'),
+            'message': f"🎉 {monitored['item_name']} is NOW IN STOCK at {monitored['retailer']}! Quantity: {current_quantity}"
+        })
         
-        return [store for store in mock_stores if store['distance'] <= radius]
+        if database is not None:
+            database.save_notification(notification)
+        event_bus.publish('notification', notification)
+        # Only queued here; a slow webhook never holds up the check
+        webhook_dispatcher.enqueue(notification, key=target_key(monitored))
+        publish_stats()
 
-# Initialize monitor
-inventory_monitor = InventoryMonitor()
+# Monitors watching the same (retailer, item_id, store_id) share one scheduled
+# fetch; the coalescer also merges manual checks into a fetch already in flight
+watchers_by_target = {}
+targets_lock = threading.Lock()
+check_coalescer = CheckCoalescer()
+
+# Latest result per target, shared by manual checks and the scheduler
+result_cache = ResultCache(RESULT_CACHE_SIZE)
+
+# Multi-item lookups shared by every check of a batchable retailer
+batch_collector = BatchCollector(run_batch, batch_size, window=BATCH_WINDOW, extend=pull_ahead_targets)
+
+# Every check's price and stock, kept per item for charting
+price_history = PriceHistory(HISTORY_SAMPLES)
+
+# Restock notifications go out to webhooks from their own threads
+webhook_dispatcher = WebhookDispatcher(
+    WEBHOOK_URLS,
+    workers=WEBHOOK_WORKERS,
+    queue_size=WEBHOOK_QUEUE_SIZE,
+    batch_size=WEBHOOK_BATCH_SIZE,
+    batch_wait=WEBHOOK_BATCH_WAIT,
+    max_attempts=WEBHOOK_MAX_ATTEMPTS,
+    dedupe_window=WEBHOOK_DEDUPE_WINDOW
+)
 
-def monitor_item_loop(item: Dict):
-    """Background thread to continuously monitor an item"""
-    item_key = f"{item['id']}"
+# Open dashboards get changes pushed over /api/events instead of polling. A check
+# that only moves an item's last_check is pushed with the others like it every
+# CHECKED_PUSH_INTERVAL seconds rather than as an event of its own. Each open
+# stream ties up one of the worker's threads (--threads in the Procfile), so only
+# EVENT_STREAMS_MAX are accepted; dashboards past that poll instead
+EVENT_STREAMS_MAX = int(os.environ.get('EVENT_STREAMS_MAX', 16))
+event_bus = EventBus(max_subscribers=EVENT_STREAMS_MAX)
+CHECKED_PUSH_INTERVAL = float(os.environ.get('CHECKED_PUSH_INTERVAL', 5))
+checked_since_push: Dict[int, Dict] = {}
+checked_lock = threading.Lock()
+published_stats = {}
+stats_publish_lock = threading.Lock()
+
+# Manual check-all fans out over its own pool so it never waits behind scheduled checks
+check_all_executor = ThreadPoolExecutor(max_workers=CHECK_ALL_WORKERS, thread_name_prefix='check-all')
+check_jobs = JobRegistry()
+
+# One scheduler drives every target instead of a thread per item
+check_scheduler = CheckScheduler(run_scheduled_check, max_workers=CHECK_WORKERS, max_error_delay=BACKOFF_MAX)
+adaptive_policy = AdaptivePolicy(backoff_max=BACKOFF_MAX)
+
+def warm_start_delay(key: Tuple, interval: int) -> float:
+    """Seconds until a reloaded target's first check"""
+    last_checks = [item['last_check'] for item in monitored_items.get_many(target_watchers(key)) if item.get('last_check')]
+    if last_checks:
+        elapsed = (datetime.now() - datetime.fromisoformat(max(last_checks))).total_seconds()
+        if elapsed < interval:
+            return interval - elapsed
+    # Overdue targets are spread out instead of all being checked the moment we start
+    return random.uniform(0, min(interval, WARM_START_SPREAD))
+
+def load_saved_state():
+    """Reload saved monitors and notifications"""
+    global change_cursor
+    # Read first: anything saved while loading is replayed on top, which is harmless
+    change_cursor = database.last_change()
+    monitored_items.load(database.load_items(), database.load_counter('version'), database.load_counter('last_id'))
+    notification_history.load(reversed(database.load_notifications(NOTIFICATION_HISTORY)))
+    
+    for item in monitored_items.items():
+        with targets_lock:
+            watchers_by_target.setdefault(target_key(item), set()).add(item['id'])
     
-    while item_key in monitoring_threads and monitoring_threads[item_key].get('active', False):
+    if len(monitored_items):
+        print(f"Reloaded {len(monitored_items)} monitors watching {len(watchers_by_target)} targets")
+
+def start_checks():
+    """Schedule every target's first check and start the scheduler; only the leader does this"""
+    # Past restocks tell adaptive targets when to look harder
+    for notification in notification_history.recent(NOTIFICATION_HISTORY):
+        item = find_item(notification.get('monitor_id'))
+        if item is not None:
+            adaptive_policy.record_restock(target_key(item), datetime.fromisoformat(notification['timestamp']))
+    
+    for key in list(watchers_by_target):
+        interval = target_interval(key)
+        if interval is not None:
+            check_scheduler.schedule(key, interval, warm_start_delay(key, interval))
+    check_scheduler.start()
+    webhook_dispatcher.start()
+    atexit.register(webhook_dispatcher.stop)
+
+def forget_item(item: Dict):
+    """Stop checking a removed item and tell open dashboards"""
+    # Stop scheduling checks unless another monitor watches the same target
+    unwatch_target(item)
+    price_history.forget(item['id'])
+    event_bus.publish('item_removed', {'id': item['id'], 'version': item['version']})
+    publish_stats()
+
+def apply_remote_item(item: Dict):
+    """Take in an item another worker saved
+
+    A worker saving an edit sends its whole item, status included, and its
+    status may be older than ours. The edit is taken either way, but the status
+    only if it comes from a check at least as recent as the one we have. An item
+    this worker has seen removed stays removed: the leader may have saved a
+    check of it before it heard of the removal.
+    """
+    if item['id'] in removed_ids:
+        return
+    previous, stored = monitored_items.put(item, STATUS_FIELDS)
+    if stored.get('last_check') != item.get('last_check') and database is not None:
+        # The saved row carries the older status; write ours back over it
+        database.save_item(stored)
+    if previous is None:
+        watch_target(stored)
+    elif previous['check_interval'] != stored['check_interval']:
+        check_scheduler.reschedule(target_key(stored), target_interval(target_key(stored)))
+    
+    if stored.get('last_check') and (previous is None or previous.get('last_check') != stored['last_check']):
+        price_history.record(stored['id'], time.time(), stored['price'], stored['in_stock'])
+    
+    push_change(previous, stored)
+
+def apply_remote_removal(item_id: int):
+    """Drop an item another worker removed"""
+    removed_ids.add(item_id)
+    item = monitored_items.remove(item_id)
+    if item is not None:
+        forget_item(item)
+
+def resync_items():
+    """Reload every item after falling behind the change log"""
+    global change_cursor
+    change_cursor = database.last_change()
+    saved = database.load_items()
+    for item in saved:
+        apply_remote_item(item)
+    
+    saved_ids = {item['id'] for item in saved}
+    for item in monitored_items.items():
+        if item['id'] not in saved_ids:
+            apply_remote_removal(item['id'])
+
+def sync_shared_state():
+    """Replay what other workers saved since the last sync"""
+    global change_cursor
+    while True:
+        changes, pruned = database.changes_since(change_cursor)
+        if pruned:
+            print("Fell behind the shared change log; reloading every monitor")
+            resync_items()
+            return
+        
+        for seq, origin, kind, data in changes:
+            change_cursor = seq
+            if origin == database.origin:
+                continue
+            if kind == 'item':
+                apply_remote_item(data)
+            elif kind == 'delete':
+                apply_remote_removal(data['id'])
+            elif kind == 'notification':
+                if notification_history.put(data):
+                    event_bus.publish('notification', data)
+                    publish_stats()
+        
+        if len(changes) < 1000:
+            return
+
+def shared_sync_loop():
+    while True:
+        time.sleep(SHARED_SYNC_INTERVAL)
         try:
-            # Check inventory
-            result = inventory_monitor.check_inventory(item)
-            
-            # Update item status
-            for monitored in monitored_items:
-                if monitored['id'] == item['id']:
-                    previous_quantity = monitored.get('current_quantity', 0)
-                    current_quantity = result.get('quantity', 0)
-                    
-                    monitored['last_check'] = datetime.now().isoformat()
-                    monitored['in_stock'] = result.get('in_stock', False)
-                    monitored['current_quantity'] = current_quantity
-                    monitored['price'] = result.get('price')
-                    
-                    # Store any errors
-                    if 'error' in result:
-                        monitored['last_error'] = result['error']
-                    else:
-                        monitored['last_error'] = None
-                    
-                    # Detect stock changes (0 to any positive number)
-                    if previous_quantity == 0 and current_quantity > 0:
-                        notification = {
-                            'id': len(notification_history) + 1,
-                            'timestamp': datetime.now().isoformat(),
-                            'item_name': monitored['item_name'],
-                            'retailer': monitored['retailer'],
-                            'quantity': current_quantity,
-                            'location_type': monitored.get('location_type', 'online'),
-                            'store_id': monitored.get('store_id'),
-                            'price': monitored.get('price'),
-                            'message': f"🎉 {monitored['item_name']} is NOW IN STOCK at {monitored['retailer']}! Quantity: {current_quantity}"
-                        }
-                        notification_history.insert(0, notification)
-                        
-                        # Keep only last 50 notifications
-                        if len(notification_history) > 50:
-                            notification_history.pop()
-                    
-                    break
-            
-            # Wait for the specified interval
-            interval = item.get('check_interval', '2m')
-            sleep_time = CHECK_INTERVALS.get(interval, 120)
-            time.sleep(sleep_time)
-            
+            sync_shared_state()
         except Exception as e:
-            print(f"Error monitoring item {item['id']}: {e}")
-            time.sleep(60)
+            print(f"Error syncing shared state: {e}")
+
+if SHARED_STATE and not DATABASE_PATH:
+    print("SHARED_STATE needs DATABASE_PATH; running as a single worker")
+    SHARED_STATE = False
+
+# `python app.py` runs this module twice under the debug reloader: once in a watcher
+# process that only restarts the server on code changes, and once in the child
+# that serves. Only the child may open the database and run checks, or two
+# schedulers would check and save the same monitors
+RELOADER_WATCHER = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+database = None
+change_cursor = 0
+# Ids removed since this worker started; ids are never reused, so none may come back
+removed_ids: Set[int] = set()
+leader_lease = None
+if DATABASE_PATH and not RELOADER_WATCHER:
+    database = MonitorDatabase(DATABASE_PATH, DATABASE_FLUSH_INTERVAL,
+                               origin=monitored_items.epoch if SHARED_STATE else None)
+    load_saved_state()
+    atexit.register(database.close)
+
+if not RELOADER_WATCHER:
+    threading.Thread(target=push_checked_loop, name='push-checked', daemon=True).start()
+    if SHARED_STATE:
+        threading.Thread(target=shared_sync_loop, name='shared-sync', daemon=True).start()
+        leader_lease = LeaderLease(DATABASE_PATH + '.leader', start_checks)
+        leader_lease.start()
+    else:
+        start_checks()
 
 @app.route('/')
 def index():
@@ -658,22 +677,28 @@ def search_stores():
     """Find stores near a zip code"""
     data = request.json
     retailer = data.get('retailer')
-    zip_code = data.get('zip_code')
-    radius = data.get('radius', 10)
+    zip_code = str(data.get('zip_code') or '')
+    try:
+        radius = float(data.get('radius', 10))
+    except (TypeError, ValueError):
+        return jsonify({'stores': [], 'error': 'radius must be a number of miles'}), 400
+    
+    if normalize_zip(zip_code) is None:
+        return jsonify({'stores': [], 'error': 'zip_code must be a 5-digit ZIP code'}), 400
     
     stores = inventory_monitor.find_nearby_stores(retailer, zip_code, radius)
-    return jsonify({'stores': stores})
+    response = {'stores': stores, 'sample_data': any(store['sample'] for store in stores)}
+    if default_store_locator().locate_zip(zip_code) is None:
+        # Not an error: the bundled data simply doesn't reach every ZIP
+        response['message'] = f'No store data near {zip_code} yet; the bundled store list only covers some cities'
+    return jsonify(response)
 
 @app.route('/api/monitor/add', methods=['POST'])
 def add_monitor():
     """Add an item to monitor"""
-    global item_id_counter
-    
     data = request.json
-    item_id_counter += 1
     
-    new_item = {
-        'id': item_id_counter,
+    new_item = monitored_items.add({
         'retailer': data.get('retailer'),
         'item_id': data.get('item_id'),
         'item_name': data.get('item_name'),
@@ -682,117 +707,447 @@ def add_monitor():
         'store_name': data.get('store_name'),
         'zip_code': data.get('zip_code'),
         'check_interval': data.get('check_interval', '2m'),
+        'adaptive': parse_flag(data.get('adaptive')),
+        'min_interval': data.get('min_interval'),
+        'max_interval': data.get('max_interval'),
         'added_at': datetime.now().isoformat(),
         'last_check': None,
         'in_stock': False,
         'current_quantity': 0,
         'price': None,
         'last_error': None
-    }
+    }, database.allocate_id() if SHARED_STATE else None)
     
-    monitored_items.append(new_item)
-    
-    # Start monitoring thread
-    thread = threading.Thread(target=monitor_item_loop, args=(new_item,), daemon=True)
-    monitoring_threads[f"{new_item['id']}"] = {'thread': thread, 'active': True}
-    thread.start()
+    watch_target(new_item)
+    publish_item(new_item)
     
     return jsonify({'success': True, 'item': new_item})
 
+@app.route('/api/monitor/import', methods=['POST'])
+def import_monitors():
+    """Add many monitors from a CSV or NDJSON body (?format=csv|ndjson, or by Content-Type)
+
+    Rows are validated as the body streams in and added in one step. A row
+    identical to an existing monitor, or to one earlier in the upload, is
+    skipped; several monitors of one page (different names or intervals) are not.
+    Pages new to the scheduler get their first check spread out rather than all
+    at once. Rejected rows are reported by line number (the first 100).
+    """
+    fmt = format_for(request.content_type, request.args.get('format'))
+    if fmt is None:
+        return jsonify({'success': False, 'error': f"Send text/csv or application/x-ndjson, or pass ?format={'|'.join(FORMATS)}"}), 400
+    
+    rows = []
+    errors = []
+    rejected = 0
+    duplicates = 0
+    # Existing monitors go through the same normalization as the rows they're compared with
+    seen = set()
+    for item in monitored_items.items():
+        fields, error = parse_row(item, RETAILERS, CHECK_INTERVALS)
+        if error is None:
+            seen.add(row_key(fields))
+    for line_number, row, error in read_rows(request.stream, fmt):
+        if error is None:
+            fields, error = parse_row(row, RETAILERS, CHECK_INTERVALS)
+        if error is not None:
+            rejected += 1
+            if len(errors) < 100:
+                errors.append({'line': line_number, 'error': error})
+            continue
+        
+        key = row_key(fields)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        if len(rows) >= IMPORT_MAX_ROWS:
+            return jsonify({'success': False, 'error': f'More than {IMPORT_MAX_ROWS} rows; split the file'}), 413
+        rows.append(dict(fields, added_at=datetime.now().isoformat(), last_check=None, in_stock=False,
+                         current_quantity=0, price=None, last_error=None))
+    
+    first_id = database.allocate_ids(len(rows)) if SHARED_STATE and rows else None
+    added = monitored_items.add_many(rows, first_id)
+    for item in added:
+        watch_target(item, spread=IMPORT_SPREAD)
+        if database is not None:
+            database.save_item(item)
+    
+    # One reload for open dashboards instead of an event per row
+    if added:
+        event_bus.publish('reset', {})
+        publish_stats()
+    
+    return jsonify({'success': True, 'added': len(added), 'duplicates': duplicates, 'rejected': rejected,
+                    'errors': errors})
+
+@app.route('/api/monitor/export')
+def export_monitors():
+    """Every monitor and its current state as CSV or NDJSON (?format=, default csv), streamed"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'error': f"format must be {' or '.join(FORMATS)}"}), 400
+    
+    def items():
+        # Only ids are snapshotted up front; items are copied a chunk at a time
+        item_ids = monitored_items.ids()
+        for start in range(0, len(item_ids), 500):
+            yield from monitored_items.get_many(item_ids[start:start + 500])
+    
+    return Response(export_lines(items(), fmt), mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=monitors.{fmt}'})
+
+@app.route('/api/monitor/update/<int:item_id>', methods=['PUT'])
+def update_monitor(item_id):
+    """Change a monitored item's name, check interval or adaptive scheduling"""
+    data = request.json or {}
+    changes = {key: data[key] for key in ('item_name', 'check_interval', 'adaptive', 'min_interval', 'max_interval')
+               if key in data}
+    if 'adaptive' in changes:
+        changes['adaptive'] = parse_flag(changes['adaptive'])
+    for key in ('min_interval', 'max_interval'):
+        if key in changes:
+            # Empty means the default bounds again
+            changes[key] = changes[key] or None
+    
+    for key in ('check_interval', 'min_interval', 'max_interval'):
+        if changes.get(key) is not None and (not isinstance(changes[key], str) or changes[key] not in CHECK_INTERVALS):
+            return jsonify({'success': False, 'error': f"Unknown interval: {changes[key]}"}), 400
+    
+    changed = monitored_items.update(item_id, changes)
+    if changed is None:
+        return jsonify({'success': False, 'error': 'Item not found'}), 404
+    
+    item = changed[1]
+    if 'check_interval' in changes:
+        check_scheduler.reschedule(target_key(item), target_interval(target_key(item)))
+    
+    publish_item(item)
+    return jsonify({'success': True, 'item': item})
+
 @app.route('/api/monitor/remove/<int:item_id>', methods=['DELETE'])
 def remove_monitor(item_id):
     """Remove an item from monitoring"""
-    global monitored_items
-    
-    # Stop monitoring thread
-    item_key = f"{item_id}"
-    if item_key in monitoring_threads:
-        monitoring_threads[item_key]['active'] = False
-        del monitoring_threads[item_key]
-    
-    # Remove from list
-    monitored_items = [item for item in monitored_items if item['id'] != item_id]
+    removed_ids.add(item_id)
+    item = monitored_items.remove(item_id)
+    if item is not None:
+        if database is not None:
+            database.delete_item(item_id, item['version'])
+        forget_item(item)
     
     return jsonify({'success': True})
 
 @app.route('/api/monitor/list')
 def list_monitors():
-    """Get all monitored items"""
-    return jsonify({'items': monitored_items})
+    """Get all monitored items, or with ?since=<version>&epoch=<epoch> only those changed or removed after it
+
+    ?retailer= and ?in_stock=1/0 narrow a full listing. The response carries the
+    list version as a strong ETag, so an unchanged list costs a 304 and no
+    serialization. Versions are per worker; a delta asked of a worker with a
+    different epoch gets the full list.
+    """
+    version = monitored_items.version
+    etag = f'{monitored_items.epoch}-{version}'
+    since = request.args.get('since', type=int)
+    retailer = request.args.get('retailer')
+    in_stock = request.args.get('in_stock')
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif since is None and (retailer or in_stock):
+        items = monitored_items.items(retailer or None, None if in_stock is None else in_stock == '1')
+        response = jsonify({'items': items, 'removed': [], 'version': version, 'epoch': monitored_items.epoch, 'full': True})
+    else:
+        response = jsonify(monitored_items.changed_since(since, request.args.get('epoch')))
+    
+    response.set_etag(etag)
+    # Browsers revalidate every time instead of reusing a stale copy
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/monitor/history/<int:item_id>')
+def get_item_history(item_id):
+    """An item's price and stock history in time buckets
+
+    ?start= and ?end= are Unix timestamps (default: all of it) and ?resolution=
+    is the bucket width in seconds (default: about HISTORY_BUCKETS buckets).
+    """
+    if find_item(item_id) is None:
+        return jsonify({'success': False, 'error': 'Item not found'}), 404
+    
+    span = price_history.span(item_id)
+    if span is None:
+        return jsonify({'success': True, 'item_id': item_id, 'buckets': []})
+    
+    try:
+        start = float(request.args.get('start', span[0]))
+        end = float(request.args.get('end', span[1]))
+        resolution = float(request.args.get('resolution', 0)) or max(1.0, math.ceil((end - start) / HISTORY_BUCKETS))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start, end and resolution must be numbers'}), 400
+    if resolution <= 0 or end < start:
+        return jsonify({'success': False, 'error': 'resolution must be > 0 and end >= start'}), 400
+    
+    return jsonify({
+        'success': True,
+        'item_id': item_id,
+        'start': start,
+        'end': end,
+        'resolution': resolution,
+        'buckets': price_history.query(item_id, start, end, resolution)
+    })
+
+def result_max_age() -> Optional[float]:
+    """Oldest cached result a manual check accepts, from ?force and ?max_age; None if invalid"""
+    if request.args.get('force') == '1':
+        return 0.0
+    try:
+        return max(0.0, float(request.args.get('max_age', RESULT_CACHE_TTL)))
+    except ValueError:
+        return None
 
 @app.route('/api/monitor/check/<int:item_id>', methods=['POST'])
 def check_item_now(item_id):
-    """Manually check an item immediately"""
-    for item in monitored_items:
-        if item['id'] == item_id:
-            result = inventory_monitor.check_inventory(item)
-            
-            # Update item
-            item['last_check'] = datetime.now().isoformat()
-            item['in_stock'] = result.get('in_stock', False)
-            item['current_quantity'] = result.get('quantity', 0)
-            item['price'] = result.get('price')
-            
-            if 'error' in result:
-                item['last_error'] = result['error']
-            else:
-                item['last_error'] = None
-            
-            return jsonify({'success': True, 'result': result})
-    
-    return jsonify({'success': False, 'error': 'Item not found'}), 404
+    """Manually check an item immediately
+
+    A result cached in the last ?max_age seconds (RESULT_CACHE_TTL by default)
+    is returned instead of fetching again, unless ?force=1.
+    """
+    item = find_item(item_id)
+    if item is None:
+        return jsonify({'success': False, 'error': 'Item not found'}), 404
+    
+    max_age = result_max_age()
+    if max_age is None:
+        return jsonify({'success': False, 'error': 'max_age must be a number of seconds'}), 400
+    
+    result = check_target(item, max_age)
+    
+    # Every monitor watching the same target gets the fresh result; a cached
+    # one only goes to monitors that didn't already get it when it was fetched
+    if result.get('cached'):
+        catch_up_watchers(target_key(item), result)
+    else:
+        for watcher_id in target_watchers(target_key(item)) or [item_id]:
+            update_item_status(watcher_id, result)
+    
+    return jsonify({'success': True, 'result': result})
+
+def start_target_check(item: Dict, max_age: float = 0) -> Future:
+    """Start checking a monitor's target in the background"""
+    if FETCH_BACKEND == 'async':
+        cached = result_cache.get(target_key(item), max_age) if max_age > 0 else None
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+        return check_coalescer.submit(target_key(item), lambda: submit_inventory(item))
+    return check_all_executor.submit(check_target, item, max_age)
+
+def check_all_row(item: Dict, result: Dict) -> Dict:
+    return {
+        'item_id': item['id'],
+        'item_name': item['item_name'],
+        'in_stock': item['in_stock'],
+        'quantity': item['current_quantity'],
+        'price': item['price'],
+        'error': result.get('error'),
+        'cached': result.get('cached', False)
+    }
+
+def iter_check_all(budget: float, max_age: float = 0) -> Iterator[Dict]:
+    """Check every monitored item concurrently, yielding each item's row as its target finishes
+
+    Targets with a cached result at most `max_age` seconds old aren't fetched
+    again. Stops waiting once `budget` seconds have passed and ends with a
+    {'done': True, 'pending': [...]} row naming the items still being checked.
+    """
+    deadline = time.monotonic() + budget
+    
+    # Monitors sharing a target are fetched once
+    items_by_target = {}
+    for item in monitored_items.items():
+        items_by_target.setdefault(target_key(item), []).append(item)
+    
+    futures = {start_target_check(items[0], max_age): key for key, items in items_by_target.items()}
+    
+    def apply(key: Tuple, result: Dict) -> List[Dict]:
+        if result.get('cached'):
+            caught_up = {item['id']: item for item in catch_up_watchers(key, result)}
+            return [caught_up.get(item['id']) or item for item in items_by_target[key]]
+        updated = []
+        for item in items_by_target[key]:
+            changed = update_item_status(item['id'], result)
+            updated.append(changed[1] if changed else item)
+        return updated
+    
+    def apply_late(key: Tuple, future: Future):
+        if future.exception() is None:
+            apply(key, future.result())
+    
+    try:
+        for future in as_completed(list(futures), timeout=max(0.0, deadline - time.monotonic())):
+            key = futures.pop(future)
+            result = future.result()
+            for item in apply(key, result):
+                yield check_all_row(item, result)
+    except concurrent.futures.TimeoutError:
+        pass
+    finally:
+        # Checks that outlive the budget (or a dropped client) still update their items
+        for future, key in futures.items():
+            future.add_done_callback(functools.partial(apply_late, key))
+    
+    yield {'done': True, 'pending': [item['id'] for key in futures.values() for item in items_by_target[key]]}
 
 @app.route('/api/monitor/check-all', methods=['POST'])
 def check_all_items():
-    """Manually check all items immediately"""
-    results = []
+    """Manually check all items immediately
+
+    ?stream=1 streams one NDJSON line per item as it finishes, ?async=1 returns a
+    job id to poll, and ?budget=<seconds> caps how long the call waits. Cached
+    results are reused as for a single check (?max_age, ?force=1).
+    """
+    as_job = request.args.get('async') == '1'
+    try:
+        budget = float(request.args.get('budget', CHECK_ALL_JOB_BUDGET if as_job else CHECK_ALL_BUDGET))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'budget must be a number of seconds'}), 400
+    max_age = result_max_age()
+    if max_age is None:
+        return jsonify({'success': False, 'error': 'max_age must be a number of seconds'}), 400
     
-    for item in monitored_items:
-        result = inventory_monitor.check_inventory(item)
-        
-        item['last_check'] = datetime.now().isoformat()
-        item['in_stock'] = result.get('in_stock', False)
-        item['current_quantity'] = result.get('quantity', 0)
-        item['price'] = result.get('price')
-        
-        if 'error' in result:
-            item['last_error'] = result['error']
+    if as_job:
+        job = check_jobs.start(len(monitored_items), iter_check_all(budget, max_age))
+        return jsonify({'success': True, 'job': job}), 202
+    
+    if request.args.get('stream') == '1':
+        rows = (json.dumps(row) + '\n' for row in iter_check_all(budget, max_age))
+        return Response(rows, mimetype='application/x-ndjson')
+    
+    results = []
+    pending = []
+    for row in iter_check_all(budget, max_age):
+        if row.get('done'):
+            pending = row['pending']
         else:
-            item['last_error'] = None
-        
-        results.append({
-            'item_id': item['id'],
-            'item_name': item['item_name'],
-            'in_stock': item['in_stock'],
-            'quantity': item['current_quantity']
-        })
+            results.append(row)
+    
+    return jsonify({'success': True, 'results': results, 'pending': pending})
+
+@app.route('/api/monitor/check-all/<job_id>')
+def get_check_all_job(job_id):
+    """Progress of a background check-all; ?after=<n> skips results already seen"""
+    job = check_jobs.get(job_id, request.args.get('after', 0, type=int))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/rate-limits')
+def get_rate_limits():
+    """Current token bucket level for each retailer"""
+    return jsonify({'rate_limits': rate_limiter.snapshot()})
+
+@app.route('/api/rate-limits', methods=['PUT'])
+def update_rate_limit():
+    """Change a retailer's request rate or burst size"""
+    data = request.json or {}
+    retailer = data.get('retailer')
+    rate = data.get('rate')
+    burst = data.get('burst')
+    
+    if retailer not in rate_limiter.buckets:
+        return jsonify({'success': False, 'error': f'Unknown retailer: {retailer}'}), 404
+    # bool is an int to Python, but `true` isn't a rate
+    if any(value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value))
+           for value in (rate, burst)) or (rate is not None and rate <= 0) or (burst is not None and burst < 1):
+        return jsonify({'success': False, 'error': 'rate must be a number > 0 and burst a number >= 1'}), 400
     
-    return jsonify({'success': True, 'results': results})
+    rate_limiter.configure(retailer, rate, burst)
+    return jsonify({'success': True, 'rate_limit': rate_limiter.buckets[retailer].snapshot()})
 
 @app.route('/api/notifications')
 def get_notifications():
-    """Get recent notifications"""
-    return jsonify({'notifications': notification_history[:20]})
+    """Get recent notifications, newest first
+
+    ?after=<id> returns only newer ones and ?before=<id> pages back through older
+    ones; ?retailer= and ?monitor_id= filter, and ?limit= caps the count (default 20).
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), NOTIFICATION_HISTORY)
+    notifications = notification_history.recent(
+        limit,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        retailer=request.args.get('retailer'),
+        monitor_id=request.args.get('monitor_id', type=int)
+    )
+    return jsonify({'notifications': notifications, 'last_id': notification_history.last_id})
 
 @app.route('/api/stats')
 def get_stats():
     """Get monitoring statistics"""
-    total_items = len(monitored_items)
-    in_stock_items = sum(1 for item in monitored_items if item.get('in_stock', False))
-    out_of_stock = total_items - in_stock_items
+    return jsonify(dict(
+        summary_stats(),
+        scheduler=check_scheduler.stats(),
+        coalescing=dict(check_coalescer.stats(), targets=len(watchers_by_target)),
+        page_cache=inventory_monitor.page_cache.stats(),
+        streaming=inventory_monitor.stream_stats.snapshot(),
+        parse_paths=inventory_monitor.parse_stats.snapshot(),
+        event_streams=event_bus.stats(),
+        history=price_history.stats(),
+        adaptive=adaptive_policy.stats(),
+        circuit_breakers=retailer_breakers.snapshot(),
+        result_cache=result_cache.stats(),
+        batching=batch_collector.stats(),
+        store_locator=default_store_locator().stats(),
+        webhooks=webhook_dispatcher.stats(),
+        worker={'pid': os.getpid(), 'shared_state': SHARED_STATE,
+                'runs_checks': leader_lease.is_leader if leader_lease is not None else True},
+        database=database.stats() if database is not None else None
+    ))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format: per-retailer fetch timings and statuses, check lag, webhook delivery, monitors and threads"""
+    counts = monitored_items.counts()
+    scheduler_stats = check_scheduler.stats()
     
-    retailers_count = {}
-    for item in monitored_items:
-        retailer = item['retailer']
-        retailers_count[retailer] = retailers_count.get(retailer, 0) + 1
+    monitors = Gauge('inventory_monitors', 'Monitored items', ['retailer'])
+    for retailer, count in counts['retailers'].items():
+        monitors.set(count, retailer)
+    in_stock = Gauge('inventory_monitors_in_stock', 'Monitored items last seen in stock')
+    in_stock.set(counts['in_stock'])
+    targets = Gauge('inventory_check_targets', 'Distinct pages checked on a schedule')
+    targets.set(scheduler_stats['scheduled'])
+    running = Gauge('inventory_checks_running', 'Scheduled checks currently running')
+    running.set(scheduler_stats['running'])
+    checks = Counter('inventory_checks_total', 'Scheduled checks run (failed: the check itself raised)', ['outcome'])
+    checks.inc('ok', amount=scheduler_stats['checks_run'] - scheduler_stats['checks_failed'])
+    checks.inc('failed', amount=scheduler_stats['checks_failed'])
+    breakers = Gauge('inventory_circuit_open', 'Whether a retailer\'s circuit breaker is holding checks back', ['retailer'])
+    for retailer, breaker in retailer_breakers.snapshot().items():
+        breakers.set(0 if breaker['state'] == 'closed' else 1, retailer)
+    threads = Gauge('inventory_threads', 'Threads running in this worker process')
+    threads.set(threading.active_count())
     
-    return jsonify({
-        'total_items': total_items,
-        'in_stock': in_stock_items,
-        'out_of_stock': out_of_stock,
-        'retailers': retailers_count,
-        'total_notifications': len(notification_history)
-    })
+    metrics = [monitors, in_stock, targets, running, checks, check_scheduler.lag_histogram]
+    metrics.extend(inventory_monitor.fetch_metrics.metrics())
+    metrics.extend(webhook_dispatcher.metrics())
+    metrics.extend([breakers, threads])
+    return Response(render_metrics(metrics), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/events')
+def stream_events():
+    """Server-Sent Events: item changes, stats deltas and new notifications as they happen"""
+    subscriber = event_bus.subscribe(request.headers.get('Last-Event-ID'))
+    if subscriber is None:
+        # Every stream slot is taken; the dashboard polls and tries again later
+        return jsonify({'success': False, 'error': 'Too many open event streams'}), 503, {'Retry-After': '60'}
+    response = Response(event_bus.stream(subscriber), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The stream unsubscribes when it ends, but only if it ever started
+    response.call_on_close(lambda: event_bus.unsubscribe(subscriber))
+    return response
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from inventory import (InventoryMonitor, RETAILERS, RETAILER_PATTERNS, REQUEST_TIMEOUT, STREAM_CHUNK_SIZE, USER_AGENT, build_request,
+                       build_batch_request, make_decoder, not_found_result, error_result, paused_result)
+from breaker import RetailerBreakers
+from matcher import IncrementalPageMatcher
+from ratelimit import RetailerRateLimiter
+
+
+class AsyncInventoryMonitor(InventoryMonitor):
+    """Same check_inventory contract as InventoryMonitor, with every fetch running on one event loop"""
+
+    def __init__(self, rate_limiter: Optional[RetailerRateLimiter] = None, streaming: bool = False,
+                 limit_per_host: int = 4, max_connections: int = 200, breakers: Optional[RetailerBreakers] = None):
+        super().__init__(rate_limiter, streaming, breakers)
+        self.limit_per_host = limit_per_host
+        self.max_connections = max_connections
+        self._client: Optional[aiohttp.ClientSession] = None
+
+        # The loop lives on its own thread so sync callers (Flask routes, the
+        # scheduler's workers) can hand it work and carry on
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, name='fetch-loop', daemon=True)
+        self._loop_thread.start()
+
+    async def _get_client(self) -> aiohttp.ClientSession:
+        if self._client is None or self._client.closed:
+            # limit_per_host caps open connections to each retailer's host; extra
+            # fetches for that host queue inside the connector instead of piling on
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.limit_per_host)
+            self._client = aiohttp.ClientSession(
+                connector=connector,
+                headers={'User-Agent': USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+        return self._client
+
+    async def stream_page_async(self, retailer: str, item_id: str, store_id: Optional[str],
+                                response: aiohttp.ClientResponse) -> Dict:
+        """Read a page in chunks, hanging up once its stock verdict and price are settled"""
+        matcher = IncrementalPageMatcher(RETAILER_PATTERNS[retailer])
+        decoder = make_decoder(response.charset)
+        stopped_early = False
+        parse_seconds = 0.0
+
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            started = time.perf_counter()
+            matcher.feed(decoder.decode(chunk))
+            parse_seconds += time.perf_counter() - started
+            if matcher.done:
+                stopped_early = True
+                break
+        else:
+            matcher.feed(decoder.decode(b'', final=True))
+
+        # total_raw_bytes (newer aiohttp) counts bytes before decompression, like Content-Length does
+        bytes_read = getattr(response.content, 'total_raw_bytes', response.content.total_bytes)
+        if stopped_early:
+            response.close()
+
+        self.stream_stats.record(retailer, bytes_read, response.content_length, stopped_early)
+        self.fetch_metrics.record_page(retailer, bytes_read, parse_seconds)
+        return self.finish_stream(retailer, item_id, store_id, matcher, response.headers.get('ETag'),
+                                  response.headers.get('Last-Modified'))
+
+    async def fetch_product_async(self, retailer: str, item_id: str, store_id: Optional[str] = None) -> Dict:
+        """Download and parse one retailer product page without blocking the loop"""
+        url, headers = self.request_headers(retailer, item_id, store_id)
+        try:
+            client = await self._get_client()
+            for attempt_headers in (headers, build_request(retailer, item_id)[1]):
+                async with client.get(url, headers=attempt_headers) as response:
+                    self.record_status(retailer, response.status, response.headers)
+                    if response.status == 304:
+                        cached = self.page_cache.on_not_modified((retailer, item_id, store_id))
+                        if cached is not None:
+                            return cached
+                        # Our copy was evicted in the meantime; ask again for the full page
+                        continue
+
+                    if response.status == 404:
+                        return not_found_result(retailer, item_id)
+
+                    response.raise_for_status()
+                    if self.streaming:
+                        return await self.stream_page_async(retailer, item_id, store_id, response)
+
+                    body = await response.read()
+                    encoding = response.get_encoding()
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+                    break
+            else:
+                return error_result(retailer, item_id, 'Unexpected 304 Not Modified')
+
+            return self.read_page(retailer, item_id, store_id, body, etag, last_modified,
+                                  lambda: body.decode(encoding, errors='replace'))
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not isinstance(e, aiohttp.ClientResponseError):
+                # Timeouts and dropped connections count against the retailer too
+                self.record_status(retailer, None)
+            print(f"{retailer} scraping error for {item_id}: {e}")
+            return error_result(retailer, item_id, str(e) or type(e).__name__)
+
+    async def check_inventory_async(self, item_config: Dict) -> Dict:
+        """Check inventory based on retailer"""
+        retailer = item_config['retailer']
+        if retailer not in RETAILERS:
+            return {'error': f'Unknown retailer: {retailer}'}
+
+        # Leave a retailer that is blocking us alone until its breaker lets a probe through
+        if not self.breakers.allow(retailer):
+            return paused_result(retailer, item_config['item_id'], self.breakers.get(retailer))
+
+        # Wait for a slot in the retailer's shared budget to avoid rate limiting
+        await self.rate_limiter.acquire_async(retailer)
+
+        with self.fetch_metrics.fetching(retailer):
+            return await self.fetch_product_async(retailer, item_config['item_id'], item_config.get('store_id'))
+
+    async def check_batch_async(self, retailer: str, item_ids: List[str]) -> Dict[str, Dict]:
+        """Check several online items with one request to the retailer's multi-item lookup"""
+        if not self.breakers.allow(retailer):
+            return {item_id: paused_result(retailer, item_id, self.breakers.get(retailer)) for item_id in item_ids}
+        await self.rate_limiter.acquire_async(retailer)
+
+        url, headers = build_batch_request(retailer, item_ids)
+        with self.fetch_metrics.fetching(retailer):
+            try:
+                client = await self._get_client()
+                async with client.get(url, headers=headers) as response:
+                    self.record_status(retailer, response.status, response.headers)
+                    response.raise_for_status()
+                    body = await response.read()
+                return self.read_batch(retailer, item_ids, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not isinstance(e, aiohttp.ClientResponseError):
+                    self.record_status(retailer, None)
+                print(f"{retailer} batch lookup error for {len(item_ids)} items: {e}")
+                return {item_id: error_result(retailer, item_id, str(e) or type(e).__name__) for item_id in item_ids}
+
+    def submit_batch(self, retailer: str, item_ids: List[str]) -> Future:
+        """Start a multi-item lookup on the event loop and return a future for its results"""
+        return asyncio.run_coroutine_threadsafe(self.check_batch_async(retailer, item_ids), self.loop)
+
+    def check_batch(self, retailer: str, item_ids: List[str]) -> Dict[str, Dict]:
+        return self.submit_batch(retailer, item_ids).result()
+
+    def submit(self, item_config: Dict) -> Future:
+        """Start a check on the event loop and return a future for its result"""
+        return asyncio.run_coroutine_threadsafe(self.check_inventory_async(item_config), self.loop)
+
+    def check_inventory(self, item_config: Dict) -> Dict:
+        """Blocking wrapper so the async backend drops in wherever InventoryMonitor is used"""
+        return self.submit(item_config).result()
+
+    def fetch_product(self, retailer: str, item_id: str, store_id: Optional[str] = None) -> Dict:
+        coroutine = self.fetch_product_async(retailer, item_id, store_id)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        """Close open connections and stop the event loop"""
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
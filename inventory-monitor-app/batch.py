@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _to_price(value: Any) -> Optional[float]:
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+def parse_bestbuy_products(data: Any) -> Dict[str, Tuple[bool, Optional[float]]]:
+    """(in_stock, price) per SKU from a Best Buy Products API response"""
+    found = {}
+    for product in (data.get('products') or []) if isinstance(data, dict) else []:
+        if not isinstance(product, dict) or product.get('sku') is None:
+            continue
+        price = _to_price(product.get('salePrice')) or _to_price(product.get('regularPrice'))
+        found[str(product['sku'])] = (bool(product.get('onlineAvailability')), price)
+    return found
+
+
+# Readers for each multi-item lookup's response, named by a retailer's batch 'format'
+BATCH_FORMATS: Dict[str, Callable[[Any], Dict[str, Tuple[bool, Optional[float]]]]] = {
+    'bestbuy-products': parse_bestbuy_products
+}
+
+
+class BatchCollector:
+    """Gathers checks for retailers with a multi-item lookup into shared requests
+
+    The first check for a retailer opens a batch that goes out `window` seconds
+    later, or as soon as it holds the retailer's batch size. When it is sent,
+    `extend(retailer, room)` may add (item, future) pairs to fill what room is
+    left, so checks due soon can ride along instead of costing a request later.
+    """
+
+    def __init__(self, run_batch: Callable[[str, List[str]], Dict[str, Dict]], max_items: Callable[[str], int],
+                 window: float = 0.25, extend: Optional[Callable[[str, int], List[Tuple[Dict, Future]]]] = None):
+        self.run_batch = run_batch
+        self.max_items = max_items
+        self.window = window
+        self.extend = extend
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[Dict, Future]]] = {}
+        self.batches = 0
+        self.items = 0
+        self.pulled_ahead = 0
+
+    def submit(self, item: Dict) -> Future:
+        """Queue an item for its retailer's next batch; the future resolves to its check result"""
+        retailer = item['retailer']
+        future = Future()
+        with self._lock:
+            pending = self._pending.get(retailer)
+            if pending is None:
+                pending = self._pending[retailer] = []
+                timer = threading.Timer(self.window, self._flush, (retailer, pending))
+                timer.daemon = True
+                timer.start()
+            pending.append((item, future))
+            full = len({str(queued['item_id']) for queued, _ in pending}) >= self.max_items(retailer)
+            if full:
+                del self._pending[retailer]
+
+        if full:
+            threading.Thread(target=self._send, args=(retailer, pending), name='batch-send', daemon=True).start()
+        return future
+
+    def _flush(self, retailer: str, pending: List):
+        with self._lock:
+            # Already sent because it filled up before the window closed
+            if self._pending.get(retailer) is not pending:
+                return
+            del self._pending[retailer]
+        self._send(retailer, pending)
+
+    def _send(self, retailer: str, pending: List[Tuple[Dict, Future]]):
+        item_ids = list(dict.fromkeys(str(item['item_id']) for item, _ in pending))
+        room = self.max_items(retailer) - len(item_ids)
+        if self.extend is not None and room > 0:
+            # A rider already in the batch still needs its future resolved, or its job stays claimed
+            riders = self.extend(retailer, room)
+            pending = pending + riders
+            item_ids.extend(dict.fromkeys(str(item['item_id']) for item, _ in riders
+                                          if str(item['item_id']) not in item_ids))
+            with self._lock:
+                self.pulled_ahead += len(riders)
+
+        try:
+            results = self.run_batch(retailer, item_ids)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(item_ids)
+        for item, future in pending:
+            future.set_result(results[str(item['item_id'])])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'pulled_ahead': self.pulled_ahead,
+                'requests_saved': self.items - self.batches
+            }
@@ -0,0 +1,182 @@
+"""Check of batched scheduled checks through the app, against the local stand-in from benchmark.py
+
+    python batchcheck.py [--pages 200] [--batch-size 7] [--seconds 10] [--racers 4] [--backend sync|async] [--seed 0]
+
+Best Buy monitors, two on some pages, are checked every second by the app's
+own scheduler, BatchCollector and pull-ahead. A stand-in of the Products API
+answers from the corpus labels. Manual checks race the scheduled ones, aimed
+at targets a batch could pull ahead at that moment. The batch size is cut down, so batches fill up before their
+window closes, and riders are pulled ahead, sometimes for a SKU the batch
+already holds. Once every monitor is moved to a daily interval and the last
+check has come back:
+
+- every job the scheduler or a batch claimed has finished and is scheduled again
+- every monitor was checked and shows its page's labelled stock and price
+- no lookup asked for more than the batch size, or for a SKU twice
+
+Exits non-zero and lists what failed.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from benchmark import CORPUS_DIR, PRICE_TOLERANCE, CorpusServer, load_corpus
+from inventory import RETAILERS
+
+RETAILER = 'Best Buy'
+
+
+def make_pages(labelled: List[Dict], count: int) -> List[Dict]:
+    """`count` stand-in pages, each a copy of a labelled page under its own SKU"""
+    return [dict(labelled[n % len(labelled)], item_id=str(7000000 + n)) for n in range(count)]
+
+
+def add_monitors(client, pages: List[Dict]) -> int:
+    """A 1s monitor for every page, plus a second (30s, another name) on every third"""
+    added = 0
+    for n, page in enumerate(pages):
+        monitors = [('1s', 'watch')] + ([('30s', 'second watch')] if n % 3 == 0 else [])
+        for interval, name in monitors:
+            response = client.post('/api/monitor/add', json={'retailer': RETAILER, 'item_id': page['item_id'],
+                                                             'item_name': f"{name} {page['item_id']}",
+                                                             'check_interval': interval})
+            added += response.status_code == 200
+    return added
+
+
+def manual_checks(app, rng: random.Random, stop: threading.Event, made: List[int]):
+    """'Check now' until stopped, mostly on monitors whose target a batch could pull ahead right now
+
+    That puts their SKU in the batch already when its scheduled job rides along.
+    """
+    client = app.app.test_client()
+    while not stop.is_set():
+        now = time.monotonic()
+        soon = [key for key, job in app.check_scheduler.jobs().items()
+                if not job['running'] and job['due'] is not None and job['due'] - now < app.BATCH_PULL_AHEAD * job['interval']]
+        key = rng.choice(soon or list(app.watchers_by_target))
+        client.post(f'/api/monitor/check/{app.target_watchers(key)[0]}?force=1')
+        made.append(1)
+
+
+def wait_until_settled(scheduler, timeout: float) -> bool:
+    """Wait for every check to come back and every job to be due no sooner than a minute from now"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        now = time.monotonic()
+        if all(not job['running'] and job['due'] is not None and job['due'] > now + 60
+               for job in scheduler.jobs().values()):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def problems(app, pages: List[Dict], lookups: List[List[str]], batch_size: int) -> List[str]:
+    found = []
+    now = time.monotonic()
+    jobs = app.check_scheduler.jobs()
+    if len(jobs) != len(pages):
+        found.append(f'{len(jobs)} scheduled targets for {len(pages)} pages')
+    for key, job in jobs.items():
+        if job['running']:
+            found.append(f'{key}: still claimed after every check came back')
+        elif job['due'] is None or job['due'] <= now:
+            found.append(f'{key}: not scheduled again')
+        if job['last_run'] is None:
+            found.append(f'{key}: never ran')
+
+    labels = {page['item_id']: page for page in pages}
+    for item in app.monitored_items.items():
+        label = labels[item['item_id']]
+        if item['last_check'] is None:
+            found.append(f"monitor {item['id']} ({item['item_id']}): never checked")
+        elif item['last_error'] or item['in_stock'] != label['in_stock'] or item['price'] is None \
+                or abs(item['price'] - label['price']) > PRICE_TOLERANCE:
+            found.append(f"monitor {item['id']} ({item['item_id']}): in_stock {item['in_stock']}, price {item['price']}, "
+                         f"error {item['last_error']}; labelled {label['in_stock']}, {label['price']}")
+
+    for item_ids in lookups:
+        if len(item_ids) > batch_size:
+            found.append(f'lookup of {len(item_ids)} SKUs, over the batch size of {batch_size}')
+        if len(set(item_ids)) != len(item_ids):
+            found.append(f'lookup asked for a SKU twice: {sorted(item_ids)}')
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--pages', type=int, default=200, help='stand-in pages, one scheduled target each')
+    parser.add_argument('--batch-size', type=int, default=7, help='SKUs per lookup, in place of the real 100')
+    parser.add_argument('--seconds', type=float, default=10, help='how long checks run before settling')
+    parser.add_argument('--racers', type=int, default=4, help='threads making manual checks meanwhile')
+    parser.add_argument('--backend', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    args = parser.parse_args(argv)
+
+    labelled = [page for page in load_corpus(args.corpus) if page['retailer'] == RETAILER]
+    pages = make_pages(labelled, args.pages)
+    server = CorpusServer(pages)
+    server.start()
+    batch = RETAILERS[RETAILER]['batch']
+    original = dict(batch)
+    batch.update(url=server.batch_url(RETAILER), api_key='stand-in', max_items=args.batch_size)
+
+    # app reads its settings when imported: nothing is saved and there is one worker, which runs the checks
+    os.environ.update(DATABASE_PATH='', SHARED_STATE='0', FETCH_BACKEND=args.backend)
+    import app
+
+    try:
+        # No waiting on the real request budget
+        app.rate_limiter.configure(RETAILER, 1e9, 1e9)
+        lookups = []
+        run_batch = app.batch_collector.run_batch
+
+        def recording_run_batch(retailer: str, item_ids: List[str]) -> Dict[str, Dict]:
+            lookups.append(list(item_ids))
+            return run_batch(retailer, item_ids)
+
+        app.batch_collector.run_batch = recording_run_batch
+
+        client = app.app.test_client()
+        monitors = add_monitors(client, pages)
+        stop = threading.Event()
+        manual = []
+        racers = [threading.Thread(target=manual_checks, args=(app, random.Random(args.seed + n), stop, manual),
+                                   daemon=True) for n in range(args.racers)]
+        for racer in racers:
+            racer.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for racer in racers:
+            racer.join()
+
+        for item_id in app.monitored_items.ids():
+            client.put(f'/api/monitor/update/{item_id}', json={'check_interval': 'daily'})
+        settled = wait_until_settled(app.check_scheduler, 30)
+
+        found = [] if settled else ['checks still in flight or due within a minute after 30s']
+        found += problems(app, pages, lookups, args.batch_size)
+        scheduler = app.check_scheduler.stats()
+        batching = app.batch_collector.stats()
+        if not batching['pulled_ahead']:
+            found.append('no check was pulled ahead into a batch, so riders went untested')
+    finally:
+        app.check_scheduler.stop(wait=False)
+        RETAILERS[RETAILER]['batch'] = original
+        server.stop()
+
+    print(f"{len(pages)} pages, {monitors} monitors, {args.seconds:g}s ({args.backend}): "
+          f"{scheduler['checks_run']} scheduled checks, {len(manual)} manual, {batching['batches']} lookups "
+          f"of up to {args.batch_size}, {batching['pulled_ahead']} pulled ahead: {len(found)} problems")
+    for problem in found[:50]:
+        print(f'  {problem}')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
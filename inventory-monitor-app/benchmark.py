@@ -0,0 +1,361 @@
+"""Offline benchmark of the product page parsers over the saved pages in benchmark_corpus/
+
+    python benchmark.py [--rounds 20] [--backend sync|async] [--streaming] [--save FILE] [--compare FILE]
+
+Each page is parsed directly and then fetched through the real monitor from a
+local HTTP stand-in, so nothing goes out to the retailers. Retailers with a
+multi-item lookup are also checked in batches against a stand-in of that
+endpoint, answering from the labels. Pages/sec, bytes/sec, p50/p99 latency and
+accuracy against the labels are reported per retailer.
+--compare exits non-zero if any retailer's accuracy fell below the saved baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, quote, unquote
+
+from inventory import RETAILERS, InventoryMonitor, parse_product_page
+from pagecache import PageCache
+from ratelimit import RetailerRateLimiter
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpus')
+
+# Prices within half a cent of the label count as right
+PRICE_TOLERANCE = 0.005
+
+
+def bestbuy_products_response(pages: List[Dict]) -> Dict:
+    """What Best Buy's Products API would answer for the labelled pages"""
+    return {
+        'total': len(pages),
+        'products': [{'sku': int(page['item_id']), 'onlineAvailability': page['in_stock'],
+                      'salePrice': page['price']} for page in pages]
+    }
+
+
+# Stand-ins for each multi-item lookup format in batch.BATCH_FORMATS
+BATCH_STAND_INS = {
+    'bestbuy-products': bestbuy_products_response
+}
+
+
+def load_corpus(path: str = CORPUS_DIR) -> List[Dict]:
+    """Labelled pages from the corpus directory's labels.json, with their bodies read in"""
+    with open(os.path.join(path, 'labels.json')) as f:
+        pages = json.load(f)
+    for page in pages:
+        with open(os.path.join(path, page['file']), 'rb') as f:
+            page['body'] = f.read()
+    return pages
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming checks hang up mid-page on purpose
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class CorpusServer:
+    """Serves the corpus over HTTP on localhost
+
+    Each page is at /<retailer>/<item_id>, and /batch/<retailer>?ids=<id>,<id>
+    answers like the retailer's multi-item lookup would.
+    """
+
+    def __init__(self, pages: List[Dict]):
+        bodies = {(page['retailer'], page['item_id']): page['body'] for page in pages}
+        labels = {(page['retailer'], page['item_id']): page for page in pages}
+
+        def batch_body(retailer: str, query: str) -> Optional[bytes]:
+            stand_in = BATCH_STAND_INS.get(RETAILERS.get(retailer, {}).get('batch', {}).get('format'))
+            if stand_in is None:
+                return None
+            item_ids = ','.join(parse_qs(query).get('ids', [])).split(',')
+            found = [labels[(retailer, item_id)] for item_id in item_ids if (retailer, item_id) in labels]
+            return json.dumps(stand_in(found)).encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms to each
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                parts = tuple(unquote(part) for part in path.strip('/').split('/', 1))
+                if len(parts) == 2 and parts[0] == 'batch':
+                    body = batch_body(parts[1], query)
+                else:
+                    body = bodies.get(parts) if len(parts) == 2 else None
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = QuietServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, name='corpus-server', daemon=True)
+
+    def url(self, retailer: str) -> str:
+        """Product URL template for a retailer, in the form RETAILERS uses"""
+        return f'http://127.0.0.1:{self.server.server_address[1]}/{quote(retailer)}/{{item_id}}'
+
+    def batch_url(self, retailer: str) -> str:
+        """Multi-item lookup URL template for a retailer, in the form its batch config uses"""
+        return f'http://127.0.0.1:{self.server.server_address[1]}/batch/{quote(retailer)}?ids={{item_ids}}&size={{size}}'
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def score(page: Dict, result: Dict) -> Dict:
+    """Whether a result's stock state and price match the page's labels"""
+    price = result.get('price')
+    expected = page['price']
+    if expected is None or price is None:
+        price_ok = expected is None and price is None
+    else:
+        price_ok = abs(price - expected) <= PRICE_TOLERANCE
+    return {'stock_ok': result.get('in_stock') == page['in_stock'], 'price_ok': price_ok}
+
+
+def run_stage(pages: List[Dict], rounds: int, check: Callable[[Dict], Dict]) -> Dict:
+    """Time `check` over every page for `rounds` rounds and score each page's first result"""
+    latencies: Dict[str, List[float]] = {}
+    sizes: Dict[str, int] = {}
+    scores: Dict[str, List[Dict]] = {}
+    misses = []
+
+    for round_number in range(rounds):
+        for page in pages:
+            retailer = page['retailer']
+            started = time.perf_counter()
+            result = check(page)
+            latencies.setdefault(retailer, []).append(time.perf_counter() - started)
+            sizes[retailer] = sizes.get(retailer, 0) + len(page['body'])
+
+            if round_number == 0:
+                scored = score(page, result)
+                scores.setdefault(retailer, []).append(scored)
+                if not (scored['stock_ok'] and scored['price_ok']):
+                    misses.append({'file': page['file'], 'expected': {'in_stock': page['in_stock'], 'price': page['price']},
+                                   'got': {'in_stock': result.get('in_stock'), 'price': result.get('price'),
+                                           'parse_path': result.get('parse_path'), 'error': result.get('error')}})
+
+    retailers = {}
+    for retailer, times in latencies.items():
+        total = sum(times)
+        page_scores = scores[retailer]
+        retailers[retailer] = {
+            'pages': len(page_scores),
+            'pages_per_sec': round(len(times) / total, 1) if total else 0.0,
+            'bytes_per_sec': round(sizes[retailer] / total) if total else 0,
+            'p50_ms': round(percentile(times, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(times, 0.99) * 1000, 3),
+            'accuracy': round(sum(1 for s in page_scores if s['stock_ok'] and s['price_ok']) / len(page_scores), 3),
+            'stock_accuracy': round(sum(1 for s in page_scores if s['stock_ok']) / len(page_scores), 3),
+            'price_accuracy': round(sum(1 for s in page_scores if s['price_ok']) / len(page_scores), 3)
+        }
+    return {'retailers': retailers, 'misses': misses}
+
+
+def bench_parse(pages: List[Dict], rounds: int) -> Dict:
+    """The parsers alone, on pages already in memory"""
+    texts = {page['file']: page['body'].decode('utf-8', errors='replace') for page in pages}
+    return run_stage(pages, rounds,
+                     lambda page: parse_product_page(page['retailer'], texts[page['file']], page['item_id']))
+
+
+def bench_fetch(pages: List[Dict], rounds: int, backend: str = 'sync', streaming: bool = False) -> Dict:
+    """Full checks through the monitor against the local stand-in"""
+    server = CorpusServer(pages)
+    server.start()
+    original_urls = {retailer: config['url'] for retailer, config in RETAILERS.items()}
+    for retailer, config in RETAILERS.items():
+        config['url'] = server.url(retailer)
+
+    # No waiting on the real per-retailer budgets
+    limiter = RetailerRateLimiter({retailer: {'rate': 1e9, 'burst': 1e9} for retailer in RETAILERS})
+    if backend == 'async':
+        from async_inventory import AsyncInventoryMonitor
+        monitor = AsyncInventoryMonitor(limiter, streaming)
+    else:
+        monitor = InventoryMonitor(limiter, streaming)
+
+    def check(page: Dict) -> Dict:
+        # A fresh page cache each time, so every fetch is parsed rather than matched by hash
+        monitor.page_cache = PageCache()
+        return monitor.check_inventory({'retailer': page['retailer'], 'item_id': page['item_id']})
+
+    try:
+        return run_stage(pages, rounds, check)
+    finally:
+        if backend == 'async':
+            monitor.close()
+        for retailer, url in original_urls.items():
+            RETAILERS[retailer]['url'] = url
+        server.stop()
+
+
+def bench_batch(pages: List[Dict], rounds: int, backend: str = 'sync') -> Dict:
+    """Each batchable retailer's labelled items in one multi-item lookup per round, against the stand-in"""
+    server = CorpusServer(pages)
+    server.start()
+    batches = {retailer: config['batch'] for retailer, config in RETAILERS.items() if 'batch' in config}
+    original = {retailer: dict(batch) for retailer, batch in batches.items()}
+    for retailer, batch in batches.items():
+        batch.update(url=server.batch_url(retailer), api_key='stand-in')
+
+    limiter = RetailerRateLimiter({retailer: {'rate': 1e9, 'burst': 1e9} for retailer in RETAILERS})
+    if backend == 'async':
+        from async_inventory import AsyncInventoryMonitor
+        monitor = AsyncInventoryMonitor(limiter)
+    else:
+        monitor = InventoryMonitor(limiter)
+
+    retailers = {}
+    misses = []
+    try:
+        for retailer, batch in batches.items():
+            batch_pages = [page for page in pages if page['retailer'] == retailer][:batch['max_items']]
+            if not batch_pages:
+                continue
+            item_ids = [page['item_id'] for page in batch_pages]
+            times = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                results = monitor.check_batch(retailer, item_ids)
+                times.append(time.perf_counter() - started)
+
+            scores = []
+            for page in batch_pages:
+                result = results[page['item_id']]
+                scored = score(page, result)
+                scores.append(scored)
+                if not (scored['stock_ok'] and scored['price_ok']):
+                    misses.append({'file': page['file'], 'expected': {'in_stock': page['in_stock'], 'price': page['price']},
+                                   'got': {'in_stock': result.get('in_stock'), 'price': result.get('price'),
+                                           'parse_path': result.get('parse_path'), 'error': result.get('error')}})
+            total = sum(times)
+            retailers[retailer] = {
+                'pages': len(batch_pages),
+                'requests': rounds,
+                'pages_per_sec': round(len(batch_pages) * rounds / total, 1) if total else 0.0,
+                # Bytes of product page the batch lookups replaced
+                'bytes_per_sec': round(sum(len(page['body']) for page in batch_pages) * rounds / total) if total else 0,
+                'p50_ms': round(percentile(times, 0.50) * 1000, 3),
+                'p99_ms': round(percentile(times, 0.99) * 1000, 3),
+                'accuracy': round(sum(1 for s in scores if s['stock_ok'] and s['price_ok']) / len(scores), 3),
+                'stock_accuracy': round(sum(1 for s in scores if s['stock_ok']) / len(scores), 3),
+                'price_accuracy': round(sum(1 for s in scores if s['price_ok']) / len(scores), 3)
+            }
+    finally:
+        if backend == 'async':
+            monitor.close()
+        for retailer, batch in original.items():
+            RETAILERS[retailer]['batch'] = batch
+        server.stop()
+    return {'retailers': retailers, 'misses': misses}
+
+
+def print_stage(name: str, stage: Dict, baseline: Optional[Dict] = None):
+    print(f'\n{name}')
+    print(f"  {'retailer':<12} {'pages':>5} {'pages/s':>9} {'MB/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'accuracy':>8} {'stock':>6} {'price':>6}")
+    for retailer, row in sorted(stage['retailers'].items()):
+        line = (f"  {retailer:<12} {row['pages']:>5} {row['pages_per_sec']:>9.1f} {row['bytes_per_sec'] / 1e6:>8.1f} "
+                f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['accuracy']:>8.0%} "
+                f"{row['stock_accuracy']:>6.0%} {row['price_accuracy']:>6.0%}")
+        before = (baseline or {}).get('retailers', {}).get(retailer)
+        if before:
+            line += (f"   vs baseline: {row['pages_per_sec'] / before['pages_per_sec'] - 1:+.0%} pages/s, "
+                     f"accuracy {row['accuracy'] - before['accuracy']:+.0%}")
+        print(line)
+    for miss in stage['misses']:
+        print(f"  miss {miss['file']}: expected {miss['expected']}, got {miss['got']}")
+
+
+def accuracy_regressions(report: Dict, baseline: Dict) -> List[str]:
+    """Stage/retailer pairs whose accuracy is below the baseline's"""
+    regressions = []
+    for stage in ('parse', 'fetch', 'batch'):
+        for retailer, before in baseline.get(stage, {}).get('retailers', {}).items():
+            row = report.get(stage, {}).get('retailers', {}).get(retailer)
+            if row is not None and row['accuracy'] < before['accuracy']:
+                regressions.append(f"{stage}/{retailer}: {before['accuracy']:.0%} -> {row['accuracy']:.0%}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the product page parsers against the saved corpus')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='directory holding labels.json and the pages')
+    parser.add_argument('--rounds', type=int, default=20, help='times each page is parsed and fetched')
+    parser.add_argument('--backend', choices=('sync', 'async'), default='sync', help='fetch backend to measure')
+    parser.add_argument('--streaming', action='store_true', help='read fetched pages in chunks (STREAM_PAGES=1)')
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='baseline report to compare against')
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = {
+        'pages': len(pages),
+        'rounds': args.rounds,
+        'backend': args.backend,
+        'streaming': args.streaming,
+        'parse': bench_parse(pages, args.rounds),
+        'fetch': bench_fetch(pages, args.rounds, args.backend, args.streaming),
+        'batch': bench_batch(pages, args.rounds, args.backend)
+    }
+
+    print(f"{len(pages)} pages x {args.rounds} rounds")
+    print_stage('Parse only', report['parse'], baseline and baseline.get('parse'))
+    print_stage(f"Fetch from local stand-in ({args.backend}{', streaming' if args.streaming else ''})",
+                report['fetch'], baseline and baseline.get('fetch'))
+    print_stage(f"Batch lookups from local stand-in ({args.backend}; latency per request of all a retailer's pages)",
+                report['batch'], baseline and baseline.get('batch'))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = accuracy_regressions(report, baseline)
+        if regressions:
+            print('\nAccuracy fell below the baseline: ' + ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
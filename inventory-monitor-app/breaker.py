@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+
+def is_blocking_status(status: Optional[int]) -> bool:
+    """Whether a response (None: no response at all) looks like the retailer pushing back"""
+    return status is None or status in (403, 429) or status >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header; the HTTP-date form is ignored"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """Stops all checks for one retailer while it is blocking or failing us
+
+    Closed: requests flow and their outcomes are tracked over a sliding window.
+    Once at least `min_requests` in the window failed at `threshold` or more,
+    it opens and every check is refused for the cooldown (or the retailer's
+    Retry-After, if longer). Then it goes half-open and lets single probes
+    through: `probes` successes close it again, one failure reopens it with
+    the cooldown doubled, up to `max_cooldown`.
+    """
+
+    def __init__(self, threshold: float = 0.5, min_requests: int = 5, window: float = 60,
+                 cooldown: float = 60, max_cooldown: float = 900, probes: int = 2, probe_timeout: float = 30):
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probes = probes
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self.state = 'closed'
+        self.opened_until = 0.0
+        self.current_cooldown = cooldown
+        self.probe_started: Optional[float] = None
+        self.probe_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_failure: Optional[str] = None
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        """Whether a check may go out now; in half-open, only one probe at a time"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == 'open' and now >= self.opened_until:
+                self.state = 'half_open'
+                self.probe_successes = 0
+                self.probe_started = None
+            if self.state == 'half_open':
+                # A probe that never reported back doesn't keep the breaker stuck
+                if self.probe_started is None or now - self.probe_started > self.probe_timeout:
+                    self.probe_started = now
+                    return True
+            if self.state == 'closed':
+                return True
+            self.rejected += 1
+            return False
+
+    def _open(self, now: float, retry_after: Optional[float]):
+        self.state = 'open'
+        self.opened_until = now + max(self.current_cooldown, retry_after or 0)
+        self.times_opened += 1
+        self._outcomes.clear()
+
+    def record(self, status: Optional[int], retry_after: Optional[float] = None, reason: Optional[str] = None):
+        """Report how a request went: its HTTP status, or None if it got no response"""
+        failed = is_blocking_status(status)
+        now = time.monotonic()
+        with self._lock:
+            if failed:
+                self.last_failure = reason or (f'HTTP {status}' if status else 'no response')
+
+            if self.state == 'half_open':
+                self.probe_started = None
+                if failed:
+                    self.current_cooldown = min(self.max_cooldown, self.current_cooldown * 2)
+                    self._open(now, retry_after)
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.probes:
+                        self.state = 'closed'
+                        self.current_cooldown = self.cooldown
+                return
+
+            if self.state != 'closed':
+                # A request let through before the breaker opened
+                return
+
+            self._outcomes.append((now, failed))
+            self._trim(now)
+            failures = sum(1 for _, outcome in self._outcomes if outcome)
+            if len(self._outcomes) >= self.min_requests and failures >= self.threshold * len(self._outcomes):
+                self._open(now, retry_after)
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self.opened_until - time.monotonic()) if self.state == 'open' else 0.0
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            failures = sum(1 for _, outcome in self._outcomes if outcome)
+            return {
+                'state': self.state,
+                'retry_in': round(max(0.0, self.opened_until - now), 1) if self.state == 'open' else 0.0,
+                'window_requests': len(self._outcomes),
+                'window_failures': failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'last_failure': self.last_failure
+            }
+
+
+class RetailerBreakers:
+    """One circuit breaker per retailer, shared by every check"""
+
+    def __init__(self, retailers: Iterable[str] = (), **settings):
+        self.settings = settings
+        self.breakers: Dict[str, CircuitBreaker] = {retailer: CircuitBreaker(**settings) for retailer in retailers}
+        self._lock = threading.Lock()
+
+    def get(self, retailer: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self.breakers.get(retailer)
+            if breaker is None:
+                breaker = self.breakers[retailer] = CircuitBreaker(**self.settings)
+            return breaker
+
+    def allow(self, retailer: str) -> bool:
+        return self.get(retailer).allow()
+
+    def record(self, retailer: str, status: Optional[int], retry_after: Optional[float] = None,
+               reason: Optional[str] = None):
+        self.get(retailer).record(status, retry_after, reason)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            breakers = dict(self.breakers)
+        return {retailer: breaker.snapshot() for retailer, breaker in breakers.items()}
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+from typing import IO, Dict, Iterable, Iterator, Optional, Tuple
+
+# Columns a bulk import reads; anything else in a row is ignored
+IMPORT_FIELDS = ('retailer', 'item_id', 'item_name', 'location_type', 'store_id', 'store_name', 'zip_code',
+                 'check_interval', 'adaptive', 'min_interval', 'max_interval')
+
+# Columns an export writes: the import columns first, so an export can be imported again
+EXPORT_FIELDS = ('id',) + IMPORT_FIELDS + ('added_at', 'last_check', 'in_stock', 'current_quantity', 'price',
+                                          'last_error')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def format_for(content_type: Optional[str], requested: Optional[str] = None) -> Optional[str]:
+    """'csv' or 'ndjson' from an explicit ?format= or a Content-Type; None if neither says"""
+    if requested:
+        return requested if requested in FORMATS else None
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines'):
+        return 'ndjson'
+    return None
+
+
+def read_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """(line number, row, error) for each row of an upload, read as it arrives"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, 'expected a JSON object'
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_flag(value) -> bool:
+    """A yes/no field as sent in JSON, CSV or a form: true/false, 1/0, yes/no"""
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_row(row: Dict, retailers: Iterable[str], intervals: Iterable[str]) -> Tuple[Optional[Dict], Optional[str]]:
+    """Monitor fields from an import row, or the reason it was rejected"""
+    fields = {name: _text(row.get(name)) for name in IMPORT_FIELDS if name != 'adaptive'}
+    fields['adaptive'] = parse_flag(row.get('adaptive'))
+    fields['location_type'] = fields['location_type'] or 'online'
+    fields['check_interval'] = fields['check_interval'] or '2m'
+
+    if fields['retailer'] not in retailers:
+        return None, f"unknown retailer: {fields['retailer']}"
+    if fields['item_id'] is None:
+        return None, 'item_id is required'
+    if fields['location_type'] not in ('online', 'store'):
+        return None, f"location_type must be online or store, not {fields['location_type']}"
+    if fields['location_type'] == 'store' and fields['store_id'] is None:
+        return None, 'store monitors need a store_id'
+    for name in ('check_interval', 'min_interval', 'max_interval'):
+        if fields[name] is not None and fields[name] not in intervals:
+            return None, f"unknown {name}: {fields[name]}"
+
+    fields['item_name'] = fields['item_name'] or fields['item_id']
+    return fields, None
+
+
+def row_key(fields: Dict) -> Tuple:
+    """Everything an import sets on a monitor; two rows with the same key would add the same monitor"""
+    return tuple(fields.get(name) for name in IMPORT_FIELDS)
+
+
+def export_lines(items: Iterable[Dict], fmt: str) -> Iterator[str]:
+    """An export body in chunks of a few KB: CSV with a header row, or one JSON object per line"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+    for item in items:
+        if fmt == 'csv':
+            writer.writerow(['' if item.get(name) is None else item.get(name) for name in EXPORT_FIELDS])
+        else:
+            buffer.write(json.dumps({name: item.get(name) for name in EXPORT_FIELDS}) + '\n')
+        if buffer.tell() >= 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class CheckCoalescer:
+    """Lets every caller asking for the same target share one in-flight check"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self.started = 0
+        self.joined = 0
+
+    def _claim(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.joined += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.started += 1
+            return future, True
+
+    def _release(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def run(self, key: Hashable, check: Callable[[], Dict]) -> Dict:
+        """Run check() for key, or wait for the identical check already running"""
+        future, leader = self._claim(key)
+        if leader:
+            try:
+                future.set_result(check())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._release(key, future)
+        return future.result()
+
+    def submit(self, key: Hashable, start: Callable[[], Future]) -> Future:
+        """Like run(), for backends whose start() returns a Future instead of blocking"""
+        future, leader = self._claim(key)
+        if leader:
+            def done(f):
+                self._release(key, future)
+                if f.exception() is not None:
+                    future.set_exception(f.exception())
+                else:
+                    future.set_result(f.result())
+
+            try:
+                start().add_done_callback(done)
+            except Exception as e:
+                self._release(key, future)
+                future.set_exception(e)
+        return future
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._inflight)
+        return {'in_flight': in_flight, 'started': self.started, 'joined': self.joined}
@@ -0,0 +1,241 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from breaker import parse_retry_after
+from metrics import Counter, Gauge, Histogram
+
+# Seconds from a notification being queued to its receiver accepting it
+DELIVERY_LATENCY_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+
+class Destination:
+    """One webhook URL's queue and retry state"""
+
+    def __init__(self, url: str, name: str, queue_size: int):
+        self.url = url
+        self.name = name
+        self.queue: deque = deque()
+        self.queue_size = queue_size
+        self.first_queued: Optional[float] = None
+        self.retry_at = 0.0
+        self.failures = 0
+        self.sending = False
+        # The batch being sent is the first `in_flight` entries of the queue
+        self.in_flight = 0
+        self.counts = {'delivered': 0, 'failed': 0, 'dropped': 0, 'duplicate': 0}
+        self.latency_total = 0.0
+
+
+class WebhookDispatcher:
+    """Delivers notifications to webhooks from worker threads, off the check path
+
+    enqueue() only appends to each destination's bounded queue (dropping the
+    oldest entry not already being sent when full), so a slow or dead receiver
+    never holds up a check. Workers POST {"notifications": [...]} batches of up
+    to `batch_size`, waiting up to `batch_wait` seconds for a batch to fill. A failed batch stays at the head of
+    its queue and the destination backs off exponentially (or per Retry-After)
+    until it succeeds or `max_attempts` is reached. An alert whose key was queued
+    within the last `dedupe_window` seconds is dropped.
+    """
+
+    def __init__(self, urls: Iterable[str], workers: int = 2, queue_size: int = 1000, batch_size: int = 20,
+                 batch_wait: float = 1.0, max_attempts: int = 5, retry_delay: float = 2.0,
+                 max_retry_delay: float = 300.0, dedupe_window: float = 600.0, timeout: float = 10.0):
+        # Webhook URLs often carry a token in their path, so stats, metrics and logs only name the host
+        self.destinations = []
+        for url in urls:
+            name = urlsplit(url).netloc
+            if any(destination.name == name for destination in self.destinations):
+                name = f'{name}#{len(self.destinations) + 1}'
+            self.destinations.append(Destination(url, name, queue_size))
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.dedupe_window = dedupe_window
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        self._cond = threading.Condition()
+        self._recent: Dict[Hashable, float] = {}
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+        self.queue_depth = Gauge('inventory_webhook_queue_depth', 'Notifications waiting for delivery', ['destination'])
+        self.latency = Histogram('inventory_webhook_delivery_seconds', 'Time from queueing to delivery',
+                                 ['destination'], DELIVERY_LATENCY_BUCKETS)
+        self.outcomes = Counter('inventory_webhook_notifications_total',
+                                'Notifications by outcome (delivered, failed, dropped, duplicate)',
+                                ['destination', 'outcome'])
+        self.attempts = Counter('inventory_webhook_requests_total', 'Webhook batch requests by result',
+                                ['destination', 'result'])
+
+    def start(self):
+        with self._cond:
+            if self._running or not self.destinations:
+                return
+            self._running = True
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'webhook-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Give queued notifications up to `timeout` seconds to go out, then stop the workers"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def enqueue(self, notification: Dict, key: Optional[Hashable] = None) -> bool:
+        """Queue a notification for every destination; False if an alert with the same key went out recently"""
+        now = time.monotonic()
+        key = notification.get('monitor_id') if key is None else key
+        with self._cond:
+            if now - self._recent.get(key, -self.dedupe_window) < self.dedupe_window:
+                for destination in self.destinations:
+                    self._count(destination, 'duplicate')
+                return False
+            self._recent[key] = now
+            if len(self._recent) > 10000:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedupe_window}
+
+            for destination in self.destinations:
+                if len(destination.queue) >= destination.queue_size:
+                    self._count(destination, 'dropped')
+                    if destination.in_flight >= len(destination.queue):
+                        # Everything queued is being sent, so the new one is dropped instead
+                        continue
+                    # The oldest entry that isn't part of the batch in flight
+                    del destination.queue[destination.in_flight]
+                if not destination.queue:
+                    destination.first_queued = now
+                destination.queue.append((now, notification))
+                self.queue_depth.set(len(destination.queue), destination.name)
+            self._cond.notify_all()
+        return True
+
+    def _count(self, destination: Destination, outcome: str, amount: int = 1):
+        destination.counts[outcome] += amount
+        self.outcomes.inc(destination.name, outcome, amount=amount)
+
+    def _ready_at(self, destination: Destination) -> Optional[float]:
+        """When a destination's next batch may go out, or None if it has nothing to send"""
+        if destination.sending or not destination.queue:
+            return None
+        if destination.failures:
+            return destination.retry_at
+        if len(destination.queue) >= self.batch_size or not self._running:
+            return 0.0
+        return destination.first_queued + self.batch_wait
+
+    def _take_batch(self) -> Optional[Destination]:
+        """Wait for a destination with a batch due and mark it as sending; None once stopped and drained"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                soonest = None
+                for destination in self.destinations:
+                    ready_at = self._ready_at(destination)
+                    if ready_at is None:
+                        continue
+                    if ready_at <= now:
+                        destination.sending = True
+                        return destination
+                    soonest = ready_at if soonest is None else min(soonest, ready_at)
+
+                if not self._running and (soonest is None or all(d.failures for d in self.destinations if d.queue)):
+                    # Stopping: batches that are only waiting to fill go out; ones in backoff are left
+                    return None
+                self._cond.wait(None if soonest is None else soonest - now)
+
+    def _work(self):
+        while True:
+            destination = self._take_batch()
+            if destination is None:
+                return
+            with self._cond:
+                batch = list(destination.queue)[:self.batch_size]
+                destination.in_flight = len(batch)
+            self._send(destination, batch)
+
+    def _send(self, destination: Destination, batch: List):
+        retry_after = None
+        try:
+            response = self.session.post(destination.url, json={'notifications': [n for _, n in batch]},
+                                         timeout=self.timeout)
+            status = response.status_code
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            error = None if status < 300 else f'HTTP {status}'
+        except requests.exceptions.RequestException as e:
+            status = None
+            error = str(e)
+
+        now = time.monotonic()
+        # Other 4xx answers won't change on a retry
+        permanent = status is not None and 400 <= status < 500 and status not in (408, 429)
+        with self._cond:
+            destination.sending = False
+            destination.in_flight = 0
+            gave_up = error is not None and (permanent or destination.failures + 1 >= self.max_attempts)
+            if error is None or gave_up:
+                for _ in batch:
+                    destination.queue.popleft()
+                destination.first_queued = destination.queue[0][0] if destination.queue else None
+                destination.failures = 0
+            else:
+                destination.failures += 1
+                ceiling = min(self.max_retry_delay, self.retry_delay * 2 ** (destination.failures - 1))
+                destination.retry_at = now + max(retry_after or 0, random.uniform(ceiling / 2, ceiling))
+            retry_at = destination.retry_at
+            self.queue_depth.set(len(destination.queue), destination.name)
+            self._cond.notify_all()
+
+            if error is None:
+                self._count(destination, 'delivered', len(batch))
+                destination.latency_total += sum(now - queued_at for queued_at, _ in batch)
+            elif gave_up:
+                self._count(destination, 'failed', len(batch))
+
+        if error is None:
+            self.attempts.inc(destination.name, 'ok')
+            for queued_at, _ in batch:
+                self.latency.observe(now - queued_at, destination.name)
+            return
+
+        self.attempts.inc(destination.name, 'error')
+        if gave_up:
+            print(f"Webhook delivery to {destination.name} gave up on {len(batch)} notifications: {error}")
+        else:
+            print(f"Webhook delivery to {destination.name} failed ({error}); retrying in {retry_at - now:.0f}s")
+
+    def metrics(self) -> List:
+        return [self.queue_depth, self.latency, self.outcomes, self.attempts]
+
+    def stats(self) -> Dict:
+        with self._cond:
+            destinations = {
+                destination.name: {
+                    'queued': len(destination.queue),
+                    'failures': destination.failures,
+                    'retry_in': round(max(0.0, destination.retry_at - time.monotonic()), 1) if destination.failures else 0.0,
+                    'delivered': destination.counts['delivered'],
+                    'failed': destination.counts['failed'],
+                    'dropped': destination.counts['dropped'],
+                    'duplicates': destination.counts['duplicate'],
+                    'average_latency': round(destination.latency_total / destination.counts['delivered'], 3)
+                    if destination.counts['delivered'] else None
+                }
+                for destination in self.destinations
+            }
+        return destinations
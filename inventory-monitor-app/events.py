@@ -0,0 +1,106 @@
+import itertools
+import json
+import queue
+import threading
+import uuid
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+
+class EventBus:
+    """Fans item, stats and notification changes out to every open event stream
+
+    Recent events are kept so a client reconnecting with Last-Event-ID only
+    gets what it missed; one that fell too far behind is told to reload instead.
+    Event ids carry a random per-process epoch, so an id issued by another
+    worker (or before a restart) is never mistaken for one of ours.
+
+    Each open stream holds a server thread for as long as it stays connected,
+    so at most `max_subscribers` are open at once (None for no limit).
+    """
+
+    def __init__(self, backlog: int = 500, subscriber_queue: int = 1000, max_subscribers: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._backlog = deque(maxlen=backlog)
+        self._subscribers: List[queue.Queue] = []
+        self.subscriber_queue = subscriber_queue
+        self.max_subscribers = max_subscribers
+        self.refused = 0
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def publish(self, event_type: str, data: Dict):
+        with self._lock:
+            event = {'id': next(self._ids), 'type': event_type, 'data': data}
+            self._backlog.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client shouldn't hold events for everyone; it reloads once it drains
+                self._reset(subscriber)
+
+    def _reset(self, subscriber: queue.Queue):
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        subscriber.put_nowait({'id': None, 'type': 'reset', 'data': {}})
+
+    def _parse_event_id(self, last_event_id: str) -> Optional[int]:
+        """Sequence number of an id this bus issued, or None for anyone else's"""
+        epoch, _, seq = last_event_id.rpartition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Optional[queue.Queue]:
+        """A new subscriber's queue, or None if `max_subscribers` are already open"""
+        subscriber = queue.Queue(maxsize=self.subscriber_queue)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                self.refused += 1
+                return None
+            if last_event_id is not None:
+                seq = self._parse_event_id(last_event_id)
+                if seq is None:
+                    missed = [{'id': None, 'type': 'reset', 'data': {}}]
+                elif self._backlog and self._backlog[0]['id'] > seq + 1:
+                    # Some of what the client missed is already gone from the backlog
+                    missed = [{'id': None, 'type': 'reset', 'data': {}}]
+                else:
+                    missed = [event for event in self._backlog if event['id'] > seq]
+                for event in missed[-self.subscriber_queue:]:
+                    subscriber.put_nowait(event)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'open': len(self._subscribers), 'max': self.max_subscribers, 'refused': self.refused}
+
+    def stream(self, subscriber: queue.Queue, keepalive: float = 15) -> Iterator[str]:
+        """Server-Sent Events text for one subscribed client, until it disconnects"""
+        try:
+            # Lets the browser retry quickly after a dropped connection
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+
+                lines = []
+                if event['id'] is not None:
+                    lines.append(f"id: {self.epoch}-{event['id']}")
+                lines.append(f"event: {event['type']}")
+                lines.append(f"data: {json.dumps(event['data'])}")
+                yield '\n'.join(lines) + '\n\n'
+        finally:
+            self.unsubscribe(subscriber)
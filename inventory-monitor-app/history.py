@@ -0,0 +1,126 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+
+class SampleRing:
+    """Fixed-width (timestamp, price, in_stock) samples for one item, oldest overwritten first
+
+    Each sample is 13 bytes across three typed arrays rather than a dict per
+    check; a missing price is stored as NaN.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d')
+        self.prices = array('f')
+        self.in_stock = array('b')
+        # Index of the oldest sample once the ring has wrapped
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: float, price: Optional[float], in_stock: bool):
+        price = math.nan if price is None else price
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(timestamp)
+            self.prices.append(price)
+            self.in_stock.append(in_stock)
+            return
+        self.timestamps[self.head] = timestamp
+        self.prices[self.head] = price
+        self.in_stock[self.head] = in_stock
+        self.head = (self.head + 1) % self.capacity
+
+    def segments(self, start: float, end: float):
+        """(lo, hi) index ranges, oldest first, of the samples with start <= timestamp <= end"""
+        size = len(self.timestamps)
+        # Before wrapping the ring is one sorted run; after, [head:] then [:head]
+        runs = [(self.head, size), (0, self.head)] if self.head else [(0, size)]
+        for lo, hi in runs:
+            first = bisect_left(self.timestamps, start, lo, hi)
+            last = bisect_right(self.timestamps, end, first, hi)
+            if first < last:
+                yield first, last
+
+    def nbytes(self) -> int:
+        return (len(self.timestamps) * self.timestamps.itemsize + len(self.prices) * self.prices.itemsize
+                + len(self.in_stock) * self.in_stock.itemsize)
+
+
+class PriceHistory:
+    """Per-item price and stock history, queried in time buckets instead of raw points"""
+
+    def __init__(self, samples_per_item: int = 100000):
+        self.samples_per_item = samples_per_item
+        self._rings: Dict[int, SampleRing] = {}
+        self._lock = threading.Lock()
+
+    def record(self, item_id: int, timestamp: float, price: Optional[float], in_stock: bool):
+        with self._lock:
+            ring = self._rings.get(item_id)
+            if ring is None:
+                ring = self._rings[item_id] = SampleRing(self.samples_per_item)
+            if len(ring) and timestamp < ring.timestamps[ring.head - 1]:
+                # Samples must stay in time order for the bucket search
+                timestamp = ring.timestamps[ring.head - 1]
+            ring.append(timestamp, price, in_stock)
+
+    def forget(self, item_id: int):
+        with self._lock:
+            self._rings.pop(item_id, None)
+
+    def span(self, item_id: int) -> Optional[tuple]:
+        """(oldest, newest) sample timestamps for an item, or None if it has none"""
+        with self._lock:
+            ring = self._rings.get(item_id)
+            if ring is None or not len(ring):
+                return None
+            return ring.timestamps[ring.head], ring.timestamps[ring.head - 1]
+
+    def query(self, item_id: int, start: float, end: float, resolution: float) -> List[Dict]:
+        """Samples in [start, end] grouped into `resolution`-second buckets
+
+        Each bucket gives the min, max and last known price, whether the item was
+        in stock at its last sample, how often it was in stock, and the sample count.
+        """
+        with self._lock:
+            ring = self._rings.get(item_id)
+            if ring is None:
+                return []
+            # Copy just the requested range so recording isn't held up while it's bucketed
+            timestamps, prices, stock = array('d'), array('f'), array('b')
+            for lo, hi in ring.segments(start, end):
+                timestamps.extend(ring.timestamps[lo:hi])
+                prices.extend(ring.prices[lo:hi])
+                stock.extend(ring.in_stock[lo:hi])
+
+        buckets = []
+        lo = 0
+        while lo < len(timestamps):
+            bucket_start = start + (timestamps[lo] - start) // resolution * resolution
+            hi = bisect_left(timestamps, bucket_start + resolution, lo)
+            # NaN marks a check that found no price
+            known = [price for price in prices[lo:hi] if price == price]
+            buckets.append({
+                't': bucket_start,
+                'min': round(min(known), 2) if known else None,
+                'max': round(max(known), 2) if known else None,
+                'last': round(known[-1], 2) if known else None,
+                'in_stock': bool(stock[hi - 1]),
+                'in_stock_samples': sum(stock[lo:hi]),
+                'samples': hi - lo
+            })
+            lo = hi
+        return buckets
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'items': len(self._rings),
+                'samples': sum(len(ring) for ring in self._rings.values()),
+                'bytes': sum(ring.nbytes() for ring in self._rings.values())
+            }
@@ -0,0 +1,495 @@
+from datetime import datetime
+import codecs
+import json
+import os
+import re
+import time
+import requests
+from typing import Callable, Dict, List, Optional, Tuple
+from ratelimit import RetailerRateLimiter
+from breaker import CircuitBreaker, RetailerBreakers, parse_retry_after
+from pagecache import PageCache, content_digest
+from matcher import IncrementalPageMatcher, RetailerPatterns, StreamStats
+from structured import ParseStats, embedded_blocks, find_structured
+from metrics import FetchMetrics
+from batch import BATCH_FORMATS
+from stores import default_store_locator
+
+# User agent to avoid being blocked
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Seconds before a product page request is abandoned
+REQUEST_TIMEOUT = 15
+
+# Bytes read per step when streaming a product page
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# How each retailer's product page is fetched and read. Shared by the sync and
+# async backends so both return identical results for the same page.
+RETAILERS = {
+    'Target': {
+        'url': 'https://www.target.com/p/A-{item_id}',
+        'headers': {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        },
+        'out_of_stock_phrases': [
+            'out of stock',
+            'currently unavailable',
+            'not available',
+            'sold out',
+            'Out of stock'
+        ],
+        'in_stock_phrases': [
+            'add to cart',
+            'Add to cart',
+            'in stock',
+            'In stock',
+            'Available',
+            'available'
+        ],
+        'price_patterns': [
+            r'\$(\d+\.\d{2})',
+            r'"price":(\d+\.\d{2})',
+            r'price&quot;:(\d+\.\d{2})'
+        ],
+        'store_location_type': 'store'
+    },
+    'Walmart': {
+        # Walmart uses different URL formats
+        'url': 'https://www.walmart.com/ip/{item_id}',
+        'headers': {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        },
+        'out_of_stock_phrases': [
+            'out of stock',
+            'not available',
+            'sold out',
+            'Get in-stock alert'
+        ],
+        'in_stock_phrases': [
+            'add to cart',
+            'Add to cart',
+            'in stock',
+            'Add to list'
+        ],
+        'price_patterns': [
+            r'\$(\d+\.\d{2})',
+            r'"price":"(\d+\.\d{2})"',
+            r'price&quot;:&quot;(\d+\.\d{2})'
+        ],
+        'store_location_type': 'store'
+    },
+    'Best Buy': {
+        'url': 'https://www.bestbuy.com/site/{item_id}.p?skuId={item_id}',
+        'headers': {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        },
+        'out_of_stock_phrases': [
+            'sold out',
+            'coming soon',
+            'unavailable nearby'
+        ],
+        'in_stock_phrases': [
+            'add to cart',
+            'Add to Cart',
+            'in stock',
+            'available'
+        ],
+        'price_patterns': [
+            r'\$(\d+\.\d{2})',
+            r'"price":(\d+\.\d{2})',
+        ],
+        'store_location_type': 'store',
+        # Products API: online availability and price for up to 100 SKUs per request.
+        # Only used with an API key; store checks still read the product page
+        'batch': {
+            'url': 'https://api.bestbuy.com/v1/products(sku in({item_ids}))'
+                   '?apiKey={api_key}&show=sku,onlineAvailability,salePrice,regularPrice&pageSize={size}&format=json',
+            'api_key': os.environ.get('BESTBUY_API_KEY'),
+            'max_items': 100,
+            'item_id_pattern': r'\d+',
+            'format': 'bestbuy-products'
+        }
+    },
+    "Sam's Club": {
+        'url': 'https://www.samsclub.com/p/{item_id}',
+        'headers': {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        },
+        'out_of_stock_phrases': [
+            'out of stock',
+            'not available',
+            'sold out'
+        ],
+        'in_stock_phrases': [
+            'add to cart',
+            'Add to cart',
+            'in stock'
+        ],
+        'price_patterns': [
+            r'\$(\d+\.\d{2})',
+            r'"price":"(\d+\.\d{2})"',
+        ],
+        'store_location_type': 'club'
+    },
+    'GameStop': {
+        'url': 'https://www.gamestop.com/product/{item_id}',
+        'headers': {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        },
+        'out_of_stock_phrases': [
+            'not available',
+            'unavailable',
+            'out of stock'
+        ],
+        'in_stock_phrases': [
+            'add to cart',
+            'Add to Cart',
+            'in stock',
+            'available'
+        ],
+        'price_patterns': [
+            r'\$(\d+\.\d{2})',
+            r'"price":"(\d+\.\d{2})"',
+        ],
+        'store_location_type': 'store'
+    }
+}
+
+# Phrase tables and compiled price regexes, built once rather than on every check
+RETAILER_PATTERNS = {retailer: RetailerPatterns(config) for retailer, config in RETAILERS.items()}
+
+def make_decoder(encoding: Optional[str]):
+    """Incremental text decoder for a streamed page, falling back to UTF-8 for unknown charsets"""
+    try:
+        return codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+def build_request(retailer: str, item_id: str) -> Tuple[str, Dict]:
+    """URL and headers for a retailer's product page"""
+    config = RETAILERS[retailer]
+    return config['url'].format(item_id=item_id), config['headers']
+
+def batch_config(retailer: str) -> Optional[Dict]:
+    """The retailer's multi-item lookup, if it has one and it is usable (API key set)"""
+    batch = RETAILERS.get(retailer, {}).get('batch')
+    if batch is None or not batch.get('api_key'):
+        return None
+    return batch
+
+def can_batch(retailer: str, item_id: str, store_id: Optional[str] = None) -> bool:
+    """Whether a target can be checked through its retailer's multi-item lookup"""
+    batch = batch_config(retailer)
+    return batch is not None and not store_id and re.fullmatch(batch['item_id_pattern'], str(item_id)) is not None
+
+def build_batch_request(retailer: str, item_ids: List[str]) -> Tuple[str, Dict]:
+    """URL and headers for one multi-item lookup"""
+    batch = batch_config(retailer)
+    url = batch['url'].format(item_ids=','.join(item_ids), api_key=batch['api_key'], size=len(item_ids))
+    return url, {'User-Agent': USER_AGENT, 'Accept': 'application/json'}
+
+def not_found_result(retailer: str, item_id: str) -> Dict:
+    return {
+        'retailer': retailer,
+        'item_id': item_id,
+        'in_stock': False,
+        'quantity': 0,
+        'error': 'Product not found',
+        'timestamp': datetime.now().isoformat()
+    }
+
+def error_result(retailer: str, item_id: str, error: str) -> Dict:
+    return {
+        'retailer': retailer,
+        'item_id': item_id,
+        'in_stock': False,
+        'quantity': 0,
+        'error': error,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def paused_result(retailer: str, item_id: str, breaker: CircuitBreaker) -> Dict:
+    """Result for a check skipped because the retailer's circuit breaker is open"""
+    retry_in = max(1, round(breaker.retry_in()))
+    result = error_result(retailer, item_id, f"{retailer} checks paused after repeated failures "
+                                             f"({breaker.last_failure or 'errors'}); next try in {retry_in}s")
+    result['circuit_open'] = True
+    result['retry_after'] = retry_in
+    return result
+
+def read_product_page(retailer: str, html: str, item_id: str,
+                      store_id: Optional[str] = None) -> Tuple[Dict, Optional[int]]:
+    """parse_product_page(), and how many embedded blocks decided it (None if the rest of the page did too)"""
+    patterns = RETAILER_PATTERNS[retailer]
+
+    structured = find_structured(html)
+    if structured is not None:
+        in_stock, price, path, blocks = structured
+        if price is None:
+            return build_result(retailer, item_id, store_id, in_stock, patterns.scan_price(html), path), None
+        return build_result(retailer, item_id, store_id, in_stock, price, path), blocks
+
+    in_stock, price = patterns.scan(html)
+    return build_result(retailer, item_id, store_id, in_stock, price, 'heuristic'), None
+
+def parse_product_page(retailer: str, html: str, item_id: str, store_id: Optional[str] = None) -> Dict:
+    """Read stock status and price out of a product page
+
+    The product's embedded JSON (JSON-LD or __NEXT_DATA__) is used when the page
+    has one; the phrase heuristics only run for pages without it.
+    """
+    return read_product_page(retailer, html, item_id, store_id)[0]
+
+def parse_batch(retailer: str, body: bytes, item_ids: List[str]) -> Dict[str, Dict]:
+    """One result per requested item from a multi-item lookup's response"""
+    try:
+        found = BATCH_FORMATS[batch_config(retailer)['format']](json.loads(body))
+    except ValueError as e:
+        return {item_id: error_result(retailer, item_id, f'Unreadable batch response: {e}') for item_id in item_ids}
+
+    results = {}
+    for item_id in item_ids:
+        if item_id in found:
+            results[item_id] = build_result(retailer, item_id, None, *found[item_id], 'batch')
+        else:
+            results[item_id] = not_found_result(retailer, item_id)
+    return results
+
+def build_result(retailer: str, item_id: str, store_id: Optional[str], in_stock: bool, price: Optional[float],
+                 parse_path: str) -> Dict:
+    """Check result in the shape every caller expects"""
+    config = RETAILERS[retailer]
+    quantity = 1 if in_stock else 0  # Retailers don't usually show exact quantity
+    price = price or 0.0
+
+    return {
+        'retailer': retailer,
+        'item_id': item_id,
+        'in_stock': in_stock,
+        'quantity': quantity,
+        'store_id': store_id,
+        'location_type': config['store_location_type'] if store_id else 'online',
+        'timestamp': datetime.now().isoformat(),
+        'price': price if price > 0 else None,
+        'parse_path': parse_path
+    }
+
+class InventoryMonitor:
+    """Handles inventory checking for multiple retailers via web scraping"""
+
+    def __init__(self, rate_limiter: Optional[RetailerRateLimiter] = None, streaming: bool = False,
+                 breakers: Optional[RetailerBreakers] = None):
+        self.rate_limiter = rate_limiter or RetailerRateLimiter()
+        # Pauses every check for a retailer that keeps answering 403/429/5xx
+        self.breakers = breakers or RetailerBreakers(RETAILERS)
+        self.page_cache = PageCache()
+        # Streaming reads pages in chunks and hangs up once the answer is known
+        self.streaming = streaming
+        self.stream_stats = StreamStats()
+        self.parse_stats = ParseStats()
+        self.fetch_metrics = FetchMetrics()
+        self.last_check_times = {}
+        self.previous_stock = {}
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+
+    def record_status(self, retailer: str, status: Optional[int], headers: Optional[Dict] = None):
+        """Tell the retailer's circuit breaker how a request went (status None: no response)"""
+        retry_after = parse_retry_after(headers.get('Retry-After')) if headers is not None else None
+        self.breakers.record(retailer, status, retry_after)
+        self.fetch_metrics.record_status(retailer, status)
+
+    def request_headers(self, retailer: str, item_id: str, store_id: Optional[str] = None) -> Tuple[str, Dict]:
+        """URL and headers for a product page, with validators from the last fetch"""
+        url, headers = build_request(retailer, item_id)
+        return url, dict(headers, **self.page_cache.conditional_headers((retailer, item_id, store_id)))
+
+    def read_page(self, retailer: str, item_id: str, store_id: Optional[str], body: bytes,
+                  etag: Optional[str], last_modified: Optional[str], decode: Callable[[], str]) -> Dict:
+        """Parse a downloaded page, unless the product data it was read from last time hashes the same
+
+        Only the embedded blocks up to the product's are hashed, not the whole
+        body: the rest of a real page changes on every request (nonces, tracking
+        ids, recommendations). Pages read with the phrase heuristics, or whose
+        price came from outside the product block, are always parsed.
+        """
+        key = (retailer, item_id, store_id)
+        blocks = embedded_blocks(body)
+        span = self.page_cache.digest_span(key)
+        if span is not None and len(blocks) >= span:
+            cached = self.page_cache.on_body(key, content_digest(b'</script>'.join(blocks[:span])), etag, last_modified)
+            if cached is not None:
+                self.fetch_metrics.record_page(retailer, len(body))
+                return cached
+
+        started = time.perf_counter()
+        result, span = read_product_page(retailer, decode(), item_id, store_id)
+        self.fetch_metrics.record_page(retailer, len(body), time.perf_counter() - started)
+        self.parse_stats.record(retailer, result['parse_path'])
+        digest = content_digest(b'</script>'.join(blocks[:span])) if span is not None and len(blocks) >= span else None
+        self.page_cache.store(key, digest, etag, last_modified, result, span if digest else None)
+        return result
+
+    def finish_stream(self, retailer: str, item_id: str, store_id: Optional[str], matcher: IncrementalPageMatcher,
+                      etag: Optional[str], last_modified: Optional[str]) -> Dict:
+        """Result of a streamed page; validators are kept, but there is no product data hash to compare"""
+        result = build_result(retailer, item_id, store_id, *matcher.verdict())
+        self.parse_stats.record(retailer, result['parse_path'])
+        self.page_cache.store((retailer, item_id, store_id), None, etag, last_modified, result)
+        return result
+
+    def stream_page(self, retailer: str, item_id: str, store_id: Optional[str], response: requests.Response) -> Dict:
+        """Read a page in chunks, hanging up once its stock verdict and price are settled"""
+        matcher = IncrementalPageMatcher(RETAILER_PATTERNS[retailer])
+        decoder = make_decoder(response.encoding)
+        stopped_early = False
+        parse_seconds = 0.0
+
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            started = time.perf_counter()
+            matcher.feed(decoder.decode(chunk))
+            parse_seconds += time.perf_counter() - started
+            if matcher.done:
+                stopped_early = True
+                break
+        else:
+            matcher.feed(decoder.decode(b'', final=True))
+
+        content_length = response.headers.get('Content-Length')
+        self.stream_stats.record(retailer, response.raw.tell(), int(content_length) if content_length else None,
+                                 stopped_early)
+        self.fetch_metrics.record_page(retailer, response.raw.tell(), parse_seconds)
+        return self.finish_stream(retailer, item_id, store_id, matcher, response.headers.get('ETag'),
+                                  response.headers.get('Last-Modified'))
+
+    def fetch_product(self, retailer: str, item_id: str, store_id: Optional[str] = None) -> Dict:
+        """Download and parse one retailer product page"""
+        url, headers = self.request_headers(retailer, item_id, store_id)
+        response = None
+        try:
+            response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=self.streaming)
+            self.record_status(retailer, response.status_code, response.headers)
+
+            if response.status_code == 304:
+                cached = self.page_cache.on_not_modified((retailer, item_id, store_id))
+                if cached is not None:
+                    return cached
+                # Our copy was evicted in the meantime; ask again for the full page
+                response.close()
+                response = self.session.get(url, headers=build_request(retailer, item_id)[1], timeout=REQUEST_TIMEOUT,
+                                            stream=self.streaming)
+                self.record_status(retailer, response.status_code, response.headers)
+
+            if response.status_code == 404:
+                return not_found_result(retailer, item_id)
+
+            response.raise_for_status()
+            if self.streaming:
+                return self.stream_page(retailer, item_id, store_id, response)
+            return self.read_page(retailer, item_id, store_id, response.content, response.headers.get('ETag'),
+                                  response.headers.get('Last-Modified'), lambda: response.text)
+
+        except requests.exceptions.RequestException as e:
+            if e.response is None:
+                # Timeouts and dropped connections count against the retailer too
+                self.record_status(retailer, None)
+            print(f"{retailer} scraping error for {item_id}: {e}")
+            return error_result(retailer, item_id, str(e))
+
+        finally:
+            # Closing a streamed response mid-body drops the connection instead of reading the rest
+            if response is not None:
+                response.close()
+
+    def read_batch(self, retailer: str, item_ids: List[str], body: bytes) -> Dict[str, Dict]:
+        """Split a multi-item lookup's response into a result per item"""
+        started = time.perf_counter()
+        results = parse_batch(retailer, body, item_ids)
+        self.fetch_metrics.record_page(retailer, len(body), time.perf_counter() - started)
+        for result in results.values():
+            if result.get('parse_path'):
+                self.parse_stats.record(retailer, result['parse_path'])
+        return results
+
+    def check_batch(self, retailer: str, item_ids: List[str]) -> Dict[str, Dict]:
+        """Check several online items with one request to the retailer's multi-item lookup"""
+        # One request, so one pass through the breaker and one slot of the retailer's budget
+        if not self.breakers.allow(retailer):
+            return {item_id: paused_result(retailer, item_id, self.breakers.get(retailer)) for item_id in item_ids}
+        self.rate_limiter.acquire(retailer)
+
+        url, headers = build_batch_request(retailer, item_ids)
+        with self.fetch_metrics.fetching(retailer):
+            try:
+                response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+                self.record_status(retailer, response.status_code, response.headers)
+                response.raise_for_status()
+                return self.read_batch(retailer, item_ids, response.content)
+            except requests.exceptions.RequestException as e:
+                if e.response is None:
+                    self.record_status(retailer, None)
+                print(f"{retailer} batch lookup error for {len(item_ids)} items: {e}")
+                return {item_id: error_result(retailer, item_id, str(e)) for item_id in item_ids}
+
+    def check_target_inventory(self, tcin: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
+        """Scrape Target product page for inventory"""
+        return self.fetch_product('Target', tcin, store_id)
+
+    def check_walmart_inventory(self, item_id: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
+        """Scrape Walmart product page for inventory"""
+        return self.fetch_product('Walmart', item_id, store_id)
+
+    def check_bestbuy_inventory(self, sku: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
+        """Scrape Best Buy product page for inventory"""
+        return self.fetch_product('Best Buy', sku, store_id)
+
+    def check_sams_inventory(self, item_id: str, club_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
+        """Scrape Sam's Club product page for inventory"""
+        return self.fetch_product("Sam's Club", item_id, club_id)
+
+    def check_gamestop_inventory(self, sku: str, store_id: Optional[str] = None, zip_code: Optional[str] = None) -> Dict:
+        """Scrape GameStop product page for inventory"""
+        return self.fetch_product('GameStop', sku, store_id)
+
+    def check_inventory(self, item_config: Dict) -> Dict:
+        """Check inventory based on retailer"""
+        retailer = item_config['retailer']
+        item_id = item_config['item_id']
+        store_id = item_config.get('store_id')
+        zip_code = item_config.get('zip_code')
+
+        if retailer not in RETAILERS:
+            return {'error': f'Unknown retailer: {retailer}'}
+
+        # Leave a retailer that is blocking us alone until its breaker lets a probe through
+        if not self.breakers.allow(retailer):
+            return paused_result(retailer, item_id, self.breakers.get(retailer))
+
+        # Wait for a slot in the retailer's shared budget to avoid rate limiting
+        self.rate_limiter.acquire(retailer)
+
+        with self.fetch_metrics.fetching(retailer):
+            if retailer == 'Target':
+                return self.check_target_inventory(item_id, store_id, zip_code)
+            elif retailer == 'Walmart':
+                return self.check_walmart_inventory(item_id, store_id, zip_code)
+            elif retailer == 'Best Buy':
+                return self.check_bestbuy_inventory(item_id, store_id, zip_code)
+            elif retailer == "Sam's Club":
+                return self.check_sams_inventory(item_id, store_id, zip_code)
+            elif retailer == 'GameStop':
+                return self.check_gamestop_inventory(item_id, store_id, zip_code)
+            else:
+                return {'error': f'Unknown retailer: {retailer}'}
+
+    def find_nearby_stores(self, retailer: str, zip_code: str, radius: int) -> List[Dict]:
+        """A retailer's stores within `radius` miles of a zip code, nearest first, from the bundled store data"""
+        return default_store_locator().nearby(retailer, zip_code, radius)
@@ -0,0 +1,207 @@
+import threading
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+class ItemStore:
+    """Monitored items keyed by id, indexed by retailer and stock state
+
+    Writes never modify a stored item in place: each one swaps in a new dict
+    under the lock, so a reader holding an item never sees half an update. The
+    dashboard counters are adjusted on every write instead of being recounted.
+
+    Every write also bumps one store-wide version and stamps it on the item,
+    so clients can ask for only what changed since a version they have seen;
+    removals are remembered `removed_history` deep for the same purpose.
+    Versions only mean something within one process, so each store has a
+    random epoch that clients send back alongside them.
+    """
+
+    def __init__(self, removed_history: int = 10000):
+        self._lock = threading.Lock()
+        self._items: Dict[int, Dict] = {}
+        self._by_retailer: Dict[str, Set[int]] = {}
+        self._in_stock: Set[int] = set()
+        # Item ids ordered by their last change, oldest first
+        self._recent: 'OrderedDict[int, int]' = OrderedDict()
+        self._removed = deque(maxlen=removed_history)
+        self._removed_floor = 0
+        self._last_id = 0
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _index(self, item: Dict):
+        self._by_retailer.setdefault(item['retailer'], set()).add(item['id'])
+        if item.get('in_stock'):
+            self._in_stock.add(item['id'])
+
+    def _unindex(self, item: Dict):
+        retailer_ids = self._by_retailer.get(item['retailer'])
+        if retailer_ids is not None:
+            retailer_ids.discard(item['id'])
+            if not retailer_ids:
+                del self._by_retailer[item['retailer']]
+        self._in_stock.discard(item['id'])
+
+    def _stamp(self, item: Dict):
+        self.version += 1
+        item['version'] = self.version
+        self._recent[item['id']] = self.version
+        self._recent.move_to_end(item['id'])
+
+    def add(self, fields: Dict, item_id: Optional[int] = None) -> Dict:
+        """Store a new item under the given id, or the next free one"""
+        with self._lock:
+            if item_id is None:
+                self._last_id += 1
+                item_id = self._last_id
+            else:
+                self._last_id = max(self._last_id, item_id)
+            item = dict(fields, id=item_id)
+            self._stamp(item)
+            self._items[item['id']] = item
+            self._index(item)
+            return dict(item)
+
+    def add_many(self, fields_list: List[Dict], first_id: Optional[int] = None) -> List[Dict]:
+        """Store several new items under one lock, numbered from `first_id` or the next free id"""
+        with self._lock:
+            if first_id is None:
+                first_id = self._last_id + 1
+            added = []
+            for item_id, fields in enumerate(fields_list, first_id):
+                item = dict(fields, id=item_id)
+                self._stamp(item)
+                self._items[item_id] = item
+                self._index(item)
+                added.append(dict(item))
+            self._last_id = max(self._last_id, first_id + len(fields_list) - 1)
+            return added
+
+    def load(self, items: Iterable[Dict], version: int = 0, last_id: int = 0):
+        """Restore saved items, keeping their ids and versions"""
+        with self._lock:
+            self._last_id = last_id
+            for item in sorted(items, key=lambda item: item.get('version', 0)):
+                self._items[item['id']] = item
+                self._recent[item['id']] = item.get('version', 0)
+                self._index(item)
+                self._last_id = max(self._last_id, item['id'])
+                version = max(version, item.get('version', 0))
+            self._items = dict(sorted(self._items.items()))
+            self.version = version
+            # Removals from before the restart are gone, so older clients get a full list
+            self._removed_floor = version
+
+    def get(self, item_id: int) -> Optional[Dict]:
+        with self._lock:
+            item = self._items.get(item_id)
+            return dict(item) if item is not None else None
+
+    def ids(self) -> List[int]:
+        """Every item id, in the order the items were added"""
+        with self._lock:
+            return list(self._items)
+
+    def get_many(self, item_ids: Iterable[int]) -> List[Dict]:
+        """Items for the ids that still exist, in the order asked"""
+        with self._lock:
+            return [dict(self._items[item_id]) for item_id in item_ids if item_id in self._items]
+
+    def update(self, item_id: int, changes: Dict) -> Optional[Tuple[Dict, Dict]]:
+        """Apply changes to an item as one step; (previous, updated), or None if it's gone"""
+        with self._lock:
+            previous = self._items.get(item_id)
+            if previous is None:
+                return None
+            updated = dict(previous, **changes)
+            self._stamp(updated)
+            self._unindex(previous)
+            self._items[item_id] = updated
+            self._index(updated)
+            return dict(previous), dict(updated)
+
+    def put(self, item: Dict, status_fields: Sequence[str] = ()) -> Tuple[Optional[Dict], Dict]:
+        """Insert or replace an item as written elsewhere, keeping its id; (previous or None, stored)
+
+        `status_fields` keep their current values if the stored item was checked
+        more recently (by `last_check`) than the incoming copy.
+        """
+        with self._lock:
+            previous = self._items.get(item['id'])
+            item = dict(item)
+            if previous is not None and (previous.get('last_check') or '') > (item.get('last_check') or ''):
+                item.update((field, previous.get(field)) for field in status_fields)
+            self._stamp(item)
+            if previous is not None:
+                self._unindex(previous)
+            self._items[item['id']] = item
+            self._index(item)
+            self._last_id = max(self._last_id, item['id'])
+            return (dict(previous) if previous is not None else None), dict(item)
+
+    def remove(self, item_id: int) -> Optional[Dict]:
+        """Drop an item; returns it stamped with the version of its removal"""
+        with self._lock:
+            item = self._items.pop(item_id, None)
+            if item is None:
+                return None
+            self._unindex(item)
+            del self._recent[item_id]
+
+            self.version += 1
+            if len(self._removed) == self._removed.maxlen:
+                # Clients older than the evicted entry can no longer get a complete delta
+                self._removed_floor = self._removed[0][0]
+            self._removed.append((self.version, item_id))
+            return dict(item, version=self.version)
+
+    def items(self, retailer: Optional[str] = None, in_stock: Optional[bool] = None) -> List[Dict]:
+        """Items in the order they were added, optionally narrowed by retailer and stock state"""
+        with self._lock:
+            if retailer is None and in_stock is None:
+                return [dict(item) for item in self._items.values()]
+
+            ids = self._by_retailer.get(retailer, set()) if retailer is not None else None
+            if in_stock is True:
+                ids = self._in_stock if ids is None else ids & self._in_stock
+            elif in_stock is False:
+                ids = (self._items.keys() - self._in_stock) if ids is None else ids - self._in_stock
+            return [dict(self._items[item_id]) for item_id in sorted(ids)]
+
+    def changed_since(self, since: Optional[int], epoch: Optional[str] = None) -> Dict:
+        """Items changed and ids removed after a version, or everything if that can't be told apart
+
+        Only the changes themselves are visited, newest first, not the whole store.
+        """
+        with self._lock:
+            # A delta is only complete if every removal since then is still remembered
+            full = (since is None or since < self._removed_floor or since > self.version
+                    or (epoch is not None and epoch != self.epoch))
+            if full:
+                return {'items': [dict(item) for item in self._items.values()], 'removed': [],
+                        'version': self.version, 'epoch': self.epoch, 'full': True}
+
+            changed = []
+            for item_id in reversed(self._recent):
+                if self._recent[item_id] <= since:
+                    break
+                changed.append(dict(self._items[item_id]))
+            changed.reverse()
+
+            removed = [item_id for version, item_id in self._removed if version > since]
+            return {'items': changed, 'removed': removed, 'version': self.version, 'epoch': self.epoch, 'full': False}
+
+    def counts(self) -> Dict:
+        """Item totals for the dashboard, from the counters kept on each write"""
+        with self._lock:
+            return {
+                'total_items': len(self._items),
+                'in_stock': len(self._in_stock),
+                'out_of_stock': len(self._items) - len(self._in_stock),
+                'retailers': {retailer: len(ids) for retailer, ids in self._by_retailer.items()}
+            }
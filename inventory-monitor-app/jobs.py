@@ -0,0 +1,64 @@
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+
+class JobRegistry:
+    """Background check-all runs that clients poll for partial results"""
+
+    def __init__(self, max_jobs: int = 20):
+        self.max_jobs = max_jobs
+        self._jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, total: int, rows: Iterator[Dict]) -> Dict:
+        """Register a job and consume its rows on a background thread"""
+        job = {
+            'job_id': uuid.uuid4().hex[:12],
+            'status': 'running',
+            'total': total,
+            'results': [],
+            'pending': [],
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+        with self._lock:
+            self._jobs[job['job_id']] = job
+            # Forget the oldest finished jobs
+            while len(self._jobs) > self.max_jobs:
+                oldest_id = next((job_id for job_id, old in self._jobs.items() if old['status'] != 'running'), None)
+                if oldest_id is None:
+                    break
+                del self._jobs[oldest_id]
+
+        threading.Thread(target=self._run, args=(job, rows), daemon=True).start()
+        return self.get(job['job_id'])
+
+    def _run(self, job: Dict, rows: Iterator[Dict]):
+        try:
+            for row in rows:
+                with self._lock:
+                    if row.get('done'):
+                        job['pending'] = row['pending']
+                    else:
+                        job['results'].append(row)
+            status = 'finished'
+        except Exception as e:
+            print(f"Check-all job {job['job_id']} failed: {e}")
+            status = 'failed'
+
+        with self._lock:
+            job['status'] = status
+            job['finished_at'] = datetime.now().isoformat()
+
+    def get(self, job_id: str, after: int = 0) -> Optional[Dict]:
+        """Job progress, with only the results past the first `after`"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job, results=job['results'][after:], pending=list(job['pending']))
+            snapshot['completed'] = len(job['results'])
+            return snapshot
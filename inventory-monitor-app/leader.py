@@ -0,0 +1,59 @@
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; a single process is always the leader there
+    fcntl = None
+
+
+class LeaderLease:
+    """Elects one process among the workers sharing a lock file to run the checks
+
+    The leader holds an exclusive flock on the file for as long as it lives.
+    The OS drops the lock when that process exits or dies, and the next worker to
+    retry takes it over. Every other worker keeps serving reads meanwhile.
+    """
+
+    def __init__(self, path: str, on_elected: Callable[[], None], retry_interval: float = 2.0):
+        self.path = path
+        self.on_elected = on_elected
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._file = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='leader-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _try_acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Keep the file open: closing it would release the lock
+        self._file = lock_file
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        return True
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self._try_acquire():
+                self.is_leader = True
+                print(f"Worker {os.getpid()} is now running the checks")
+                self.on_elected()
+                return
+            self._stopped.wait(self.retry_interval)
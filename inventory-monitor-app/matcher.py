@@ -0,0 +1,142 @@
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from structured import StructuredStreamScanner
+
+# Characters of raw text carried between chunks for the price regexes. Price
+# matches are a few dozen characters at most, so this covers any split match.
+PRICE_CARRY = 256
+
+
+class RetailerPatterns:
+    """A retailer's stock phrases and price patterns, prepared once at import
+
+    Phrases are lowercased and de-duplicated up front (several retailer lists
+    repeat a phrase in two casings) and the price regexes are compiled, so a
+    check only pays for the scans themselves.
+    """
+
+    def __init__(self, config: Dict):
+        self.out_of_stock_phrases = tuple(dict.fromkeys(phrase.lower() for phrase in config['out_of_stock_phrases']))
+        self.in_stock_phrases = tuple(dict.fromkeys(phrase.lower() for phrase in config['in_stock_phrases']))
+        self.price_patterns = tuple(re.compile(pattern) for pattern in config['price_patterns'])
+        self.phrase_carry = max(len(phrase) for phrase in self.out_of_stock_phrases + self.in_stock_phrases) - 1
+
+    def scan(self, html: str) -> Tuple[bool, Optional[float]]:
+        """(in_stock, price) for a whole page"""
+        html_lower = html.lower()
+
+        # Any out-of-stock phrase settles the verdict, so the in-stock scan is skipped
+        is_out_of_stock = any(phrase in html_lower for phrase in self.out_of_stock_phrases)
+        in_stock = not is_out_of_stock and any(phrase in html_lower for phrase in self.in_stock_phrases)
+
+        return in_stock, self.scan_price(html)
+
+    def scan_price(self, html: str) -> Optional[float]:
+        """First price found, trying the patterns in priority order"""
+        for pattern in self.price_patterns:
+            price_match = pattern.search(html)
+            if price_match:
+                try:
+                    return float(price_match.group(1))
+                except ValueError:
+                    pass
+        return None
+
+
+class IncrementalPageMatcher:
+    """Reads a product page chunk by chunk and gives the same verdict as parse_product_page
+
+    A stock phrase or price split across two chunks is still found, because each
+    chunk is searched together with the tail of the one before it.
+    """
+
+    def __init__(self, patterns: RetailerPatterns):
+        self.out_of_stock_phrases = patterns.out_of_stock_phrases
+        self.in_stock_phrases = patterns.in_stock_phrases
+        self.price_patterns = patterns.price_patterns
+        self.phrase_carry = patterns.phrase_carry
+
+        self.is_out_of_stock = False
+        self.has_add_to_cart = False
+        self.prices = [None] * len(self.price_patterns)
+        self._lower_tail = ''
+        self._raw_tail = ''
+        self.structured = StructuredStreamScanner()
+
+    @property
+    def done(self) -> bool:
+        """True once more of the page can't change the verdict or the price
+
+        Only an embedded product block settles the verdict early: the phrase
+        heuristics are a fallback for pages without one, so until the page ends a
+        block further down could still overrule them. The price is settled by the
+        block's own price or once the highest-priority pattern has matched.
+        """
+        if self.structured.result is None:
+            return False
+        return self.structured.result[1] is not None or self.prices[0] is not None
+
+    def feed(self, text: str):
+        if not text:
+            return
+
+        self.structured.feed(text)
+
+        # Once an out-of-stock phrase is seen the verdict can't change, so phrases aren't scanned again
+        if not self.is_out_of_stock:
+            window = self._lower_tail + text.lower()
+            self.is_out_of_stock = any(phrase in window for phrase in self.out_of_stock_phrases)
+            if not self.has_add_to_cart:
+                self.has_add_to_cart = any(phrase in window for phrase in self.in_stock_phrases)
+            self._lower_tail = window[-self.phrase_carry:] if self.phrase_carry else ''
+
+        window = self._raw_tail + text
+        for index, pattern in enumerate(self.price_patterns):
+            if self.prices[index] is not None:
+                # Lower-priority patterns can't win any more
+                break
+            price_match = pattern.search(window)
+            if price_match:
+                try:
+                    self.prices[index] = float(price_match.group(1))
+                    break
+                except ValueError:
+                    pass
+        self._raw_tail = window[-PRICE_CARRY:]
+
+    def verdict(self) -> Tuple[bool, Optional[float], str]:
+        """(in_stock, price, parse_path) for everything fed so far"""
+        price = next((price for price in self.prices if price is not None), None)
+        if self.structured.result is not None:
+            in_stock, structured_price, path = self.structured.result
+            return in_stock, structured_price or price, path
+
+        in_stock = not self.is_out_of_stock and self.has_add_to_cart
+        return in_stock, price, 'heuristic'
+
+
+class StreamStats:
+    """Per-retailer byte counts for streamed page downloads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._retailers: Dict[str, Dict] = {}
+
+    def record(self, retailer: str, bytes_read: int, content_length: Optional[int], stopped_early: bool):
+        with self._lock:
+            stats = self._retailers.setdefault(retailer, {
+                'pages': 0, 'early_exits': 0, 'bytes_read': 0, 'bytes_saved': 0
+            })
+            stats['pages'] += 1
+            stats['bytes_read'] += bytes_read
+            if stopped_early:
+                stats['early_exits'] += 1
+                # Without a Content-Length there is no telling how much was left unread
+                if content_length:
+                    stats['bytes_saved'] += max(0, content_length - bytes_read)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {retailer: dict(stats) for retailer, stats in self._retailers.items()}
@@ -0,0 +1,164 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds from sending a product page request to having its result, parsing included
+FETCH_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30)
+
+# Seconds spent reading stock and price out of a page
+PARSE_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+# Bytes of product page actually downloaded
+RESPONSE_SIZE_BUCKETS = (10000, 50000, 100000, 250000, 500000, 1000000, 2500000)
+
+# Seconds a scheduled check started after its due time
+CHECK_LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+    """One named series family, one value per combination of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def _labels(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.label_names, values))
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, self._labels(label_values), value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{_format_labels(labels)} {_format_value(value)}' for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def add(self, amount: float, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative `le` buckets, with their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labels: str):
+        # Counted in the first bucket whose bound it doesn't exceed; made cumulative when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = self._labels(label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+def render(metrics: Iterable[Metric]) -> str:
+    """Prometheus text exposition format for a set of metrics"""
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class FetchMetrics:
+    """Per-retailer fetch latency, parse time, response sizes, status codes and requests in flight"""
+
+    def __init__(self):
+        self.latency = Histogram('inventory_fetch_seconds', 'Product page fetch time, parsing included',
+                                 ['retailer'], FETCH_LATENCY_BUCKETS)
+        self.parse_time = Histogram('inventory_parse_seconds', 'Time spent reading stock and price out of a page',
+                                    ['retailer'], PARSE_TIME_BUCKETS)
+        self.response_size = Histogram('inventory_response_bytes', 'Product page bytes downloaded',
+                                       ['retailer'], RESPONSE_SIZE_BUCKETS)
+        self.responses = Counter('inventory_responses_total',
+                                 'Product page responses by HTTP status (none: no response at all)',
+                                 ['retailer', 'status'])
+        self.in_flight = Gauge('inventory_fetches_in_flight', 'Product page fetches currently running', ['retailer'])
+
+    @contextmanager
+    def fetching(self, retailer: str):
+        """Count a fetch as in flight for the duration of the block and time it"""
+        self.in_flight.add(1, retailer)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latency.observe(time.perf_counter() - started, retailer)
+            self.in_flight.add(-1, retailer)
+
+    def record_status(self, retailer: str, status: Optional[int]):
+        self.responses.inc(retailer, str(status) if status else 'none')
+
+    def record_page(self, retailer: str, size: int, parse_seconds: Optional[float] = None):
+        """A downloaded page's size and, if it was parsed, how long that took"""
+        self.response_size.observe(size, retailer)
+        if parse_seconds is not None:
+            self.parse_time.observe(parse_seconds, retailer)
+
+    def metrics(self) -> List[Metric]:
+        return [self.latency, self.parse_time, self.response_size, self.responses, self.in_flight]
@@ -0,0 +1,93 @@
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class NotificationLog:
+    """The most recent `capacity` notifications, with ids that never repeat
+
+    Notifications are also indexed by retailer and by monitor, so a filtered
+    read only walks that retailer's or monitor's own entries.
+    """
+
+    def __init__(self, capacity: int = 500):
+        self._lock = threading.Lock()
+        self._entries: deque = deque(maxlen=capacity)
+        self._by_retailer: Dict[str, deque] = {}
+        self._by_monitor: Dict[int, deque] = {}
+        self.last_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _index(self, notification: Dict):
+        self._by_retailer.setdefault(notification['retailer'], deque()).append(notification)
+        if notification.get('monitor_id') is not None:
+            self._by_monitor.setdefault(notification['monitor_id'], deque()).append(notification)
+
+    def _drop_oldest(self):
+        # The oldest entry overall is also the oldest in each of its indexes
+        oldest = self._entries.popleft()
+        for index, key in ((self._by_retailer, oldest['retailer']), (self._by_monitor, oldest.get('monitor_id'))):
+            entries = index.get(key)
+            if entries:
+                entries.popleft()
+                if not entries:
+                    del index[key]
+
+    def _append(self, notification: Dict):
+        if len(self._entries) == self._entries.maxlen:
+            self._drop_oldest()
+        self._entries.append(notification)
+        self._index(notification)
+
+    def add(self, fields: Dict) -> Dict:
+        """Log a notification under the next id"""
+        with self._lock:
+            self.last_id += 1
+            notification = dict(fields, id=self.last_id)
+            self._append(notification)
+            return notification
+
+    def load(self, notifications: Iterable[Dict]):
+        """Restore saved notifications, oldest first"""
+        with self._lock:
+            for notification in notifications:
+                # Ids saved before they were made monotonic may repeat
+                if notification.get('id', 0) <= self.last_id:
+                    notification = dict(notification, id=self.last_id + 1)
+                self.last_id = notification['id']
+                self._append(notification)
+
+    def put(self, notification: Dict) -> bool:
+        """Take in a notification logged by another process, unless it's one we already have"""
+        with self._lock:
+            if notification['id'] <= self.last_id:
+                return False
+            self.last_id = notification['id']
+            self._append(notification)
+            return True
+
+    def recent(self, limit: int = 20, after: Optional[int] = None, before: Optional[int] = None,
+               retailer: Optional[str] = None, monitor_id: Optional[int] = None) -> List[Dict]:
+        """Newest first, at most `limit`, only ids between `after` and `before` (exclusive)"""
+        with self._lock:
+            if monitor_id is not None:
+                entries = self._by_monitor.get(monitor_id, ())
+            elif retailer is not None:
+                entries = self._by_retailer.get(retailer, ())
+            else:
+                entries = self._entries
+
+            found = []
+            for notification in reversed(entries):
+                if after is not None and notification['id'] <= after:
+                    break
+                if before is not None and notification['id'] >= before:
+                    continue
+                if retailer is not None and notification['retailer'] != retailer:
+                    continue
+                found.append(notification)
+                if len(found) == limit:
+                    break
+            return found
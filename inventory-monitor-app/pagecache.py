@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Hashable, Optional
+
+
+def content_digest(content: bytes) -> str:
+    """Cheap fingerprint of a page's product data, used to spot an unchanged page before parsing it"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class PageCache:
+    """Remembers each target's validators, content hash and last parsed result
+
+    Lets a fetch send If-None-Match / If-Modified-Since and, on a 304 or a page
+    whose product data hashes the same, reuse the previous result instead of
+    parsing again. The digest covers the first `span` embedded data blocks of
+    the page; an entry stored without one only matches on a 304.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        self.hash_matches = 0
+        self.parsed = 0
+
+    def conditional_headers(self, key: Hashable) -> Dict:
+        """Validator headers for the next request of a target"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _reuse(self, entry: Dict) -> Dict:
+        result = dict(entry['result'])
+        result['timestamp'] = datetime.now().isoformat()
+        return result
+
+    def on_not_modified(self, key: Hashable) -> Optional[Dict]:
+        """Previous result for a target the server answered with 304"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.not_modified += 1
+            return self._reuse(entry)
+
+    def digest_span(self, key: Hashable) -> Optional[int]:
+        """How many of a page's embedded blocks its stored digest covers, or None if it has none"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry['span'] if entry is not None else None
+
+    def on_body(self, key: Hashable, digest: str, etag: Optional[str], last_modified: Optional[str]) -> Optional[Dict]:
+        """Previous result if the page's product data hashes the same as last time; refreshes its validators if so"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['digest'] is None or entry['digest'] != digest:
+                return None
+            entry['etag'] = etag
+            entry['last_modified'] = last_modified
+            self._entries.move_to_end(key)
+            self.hash_matches += 1
+            return self._reuse(entry)
+
+    def store(self, key: Hashable, digest: Optional[str], etag: Optional[str], last_modified: Optional[str],
+              result: Dict, span: Optional[int] = None):
+        """Remember a freshly parsed result and the validators that came with it"""
+        with self._lock:
+            self.parsed += 1
+            if 'error' in result:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = {'digest': digest, 'span': span, 'etag': etag, 'last_modified': last_modified,
+                                  'result': result}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'not_modified': self.not_modified,
+                'hash_matches': self.hash_matches,
+                'parsed': self.parsed
+            }
@@ -0,0 +1,117 @@
+"""Parity check of the page parsers over the saved pages in benchmark_corpus/
+
+    python parity.py [--rounds 50] [--seed 0] [--corpus DIR]
+
+Every page is read with every retailer's patterns, and compared two ways:
+
+- the phrase/regex heuristics against the original per-check logic below
+  (phrases lowercased on every call, regexes compiled on every search); for
+  pages without embedded product JSON this is also what parse_product_page
+  must return
+- parse_product_page against IncrementalPageMatcher fed the page's bytes in
+  random chunk sizes through the streaming decoder, stopping once it says
+  it's done, as a streamed check does
+
+Exits non-zero and lists the mismatches if any reading disagrees.
+"""
+import argparse
+import random
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from benchmark import CORPUS_DIR, load_corpus
+from inventory import RETAILERS, RETAILER_PATTERNS, build_result, make_decoder, parse_product_page
+from matcher import IncrementalPageMatcher
+
+
+def legacy_scan(retailer: str, html: str) -> Tuple[bool, Optional[float]]:
+    """(in_stock, price) the way every check worked it out before the tables were prepared at import"""
+    config = RETAILERS[retailer]
+    html_lower = html.lower()
+
+    is_out_of_stock = any(phrase.lower() in html_lower for phrase in config['out_of_stock_phrases'])
+    has_add_to_cart = any(phrase.lower() in html_lower for phrase in config['in_stock_phrases'])
+    in_stock = not is_out_of_stock and has_add_to_cart
+
+    price = None
+    for pattern in config['price_patterns']:
+        price_match = re.search(pattern, html)
+        if price_match:
+            try:
+                price = float(price_match.group(1))
+                break
+            except ValueError:
+                pass
+    return in_stock, price
+
+
+def stream_verdict(retailer: str, body: bytes, rng: random.Random) -> Dict:
+    """A streamed check's result for a page arriving in random-sized chunks"""
+    matcher = IncrementalPageMatcher(RETAILER_PATTERNS[retailer])
+    decoder = make_decoder('utf-8')
+    position = 0
+    while position < len(body):
+        # Mostly small chunks, so phrases, prices and multi-byte characters get split
+        size = rng.choice((1, 2, 3, 7, 16, 64, 512, 4096))
+        matcher.feed(decoder.decode(body[position:position + size]))
+        position += size
+        if matcher.done:
+            break
+    else:
+        matcher.feed(decoder.decode(b'', final=True))
+    return build_result(retailer, '0', None, *matcher.verdict())
+
+
+def comparable(result: Dict) -> Tuple:
+    return result['in_stock'], result['price'], result['parse_path']
+
+
+def check_page(page: Dict, rounds: int, rng: random.Random) -> List[str]:
+    """Every disagreement between the readings of one page"""
+    html = page['body'].decode('utf-8', errors='replace')
+    mismatches = []
+    for retailer in RETAILERS:
+        label = f"{page['file']} as {retailer}"
+
+        old = legacy_scan(retailer, html)
+        new = RETAILER_PATTERNS[retailer].scan(html)
+        if old != new:
+            mismatches.append(f'{label}: heuristics {new} != original {old}')
+
+        parsed = comparable(parse_product_page(retailer, html, '0'))
+        if parsed[2] == 'heuristic':
+            old_result = comparable(build_result(retailer, '0', None, *old, 'heuristic'))
+            if parsed != old_result:
+                mismatches.append(f'{label}: parse_product_page {parsed} != original {old_result}')
+
+        for _ in range(rounds):
+            streamed = comparable(stream_verdict(retailer, page['body'], rng))
+            if streamed != parsed:
+                mismatches.append(f'{label}: streamed {streamed} != parse_product_page {parsed}')
+                break
+    return mismatches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=50, help='random chunkings per page and retailer')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    rng = random.Random(args.seed)
+    mismatches = []
+    for page in pages:
+        mismatches.extend(check_page(page, args.rounds, rng))
+
+    print(f"{len(pages)} pages x {len(RETAILERS)} retailers, {args.rounds} chunkings each: "
+          f"{len(mismatches)} mismatches")
+    for mismatch in mismatches:
+        print(f'  {mismatch}')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+# Sustained requests per second and burst size for each retailer. Walmart and
+# Sam's Club block aggressive scrapers quickest, so they get the slowest rates.
+DEFAULT_RATE_LIMITS = {
+    'Target': {'rate': 1.0, 'burst': 5},
+    'Walmart': {'rate': 0.5, 'burst': 3},
+    'Best Buy': {'rate': 1.0, 'burst': 5},
+    "Sam's Club": {'rate': 0.5, 'burst': 3},
+    'GameStop': {'rate': 0.5, 'burst': 3}
+}
+
+
+class TokenBucket:
+    """Token bucket that hands out evenly spaced request slots once its burst is spent"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.granted = 0
+        self.delayed = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it (0 when one was free)
+
+        The balance is allowed to go negative: each caller that finds the bucket
+        empty books the next free slot, so waiters leave 1/rate seconds apart
+        instead of all waking at once when tokens come back.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            self.granted += 1
+            if self.tokens >= 0:
+                return 0.0
+            self.delayed += 1
+            return -self.tokens / self.rate
+
+    def configure(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        with self.lock:
+            self._refill(time.monotonic())
+            if rate is not None:
+                self.rate = rate
+            if burst is not None:
+                self.burst = burst
+                self.tokens = min(self.tokens, burst)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'tokens': round(max(self.tokens, 0.0), 3),
+                'queued': max(0, int(-self.tokens // 1)),
+                'granted': self.granted,
+                'delayed': self.delayed
+            }
+
+
+class RetailerRateLimiter:
+    """One shared token bucket per retailer, used by every check whatever thread it runs on"""
+
+    def __init__(self, limits: Optional[Dict] = None):
+        limits = limits or DEFAULT_RATE_LIMITS
+        self.buckets = {retailer: TokenBucket(limit['rate'], limit['burst']) for retailer, limit in limits.items()}
+
+    def acquire(self, retailer: str) -> float:
+        """Block until a request to the retailer may go out; returns seconds waited"""
+        bucket = self.buckets.get(retailer)
+        wait = bucket.reserve() if bucket else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, retailer: str) -> float:
+        """acquire() for the event loop: waits without blocking other fetches"""
+        bucket = self.buckets.get(retailer)
+        wait = bucket.reserve() if bucket else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def configure(self, retailer: str, rate: Optional[float] = None, burst: Optional[float] = None):
+        if retailer not in self.buckets:
+            raise KeyError(retailer)
+        self.buckets[retailer].configure(rate, burst)
+
+    def snapshot(self) -> Dict:
+        return {retailer: bucket.snapshot() for retailer, bucket in self.buckets.items()}
+
+
+def load_rate_limits(raw: Optional[str]) -> Dict:
+    """Defaults merged with a JSON override such as '{"Walmart": {"rate": 0.2}}'"""
+    limits = {retailer: dict(limit) for retailer, limit in DEFAULT_RATE_LIMITS.items()}
+    if raw:
+        for retailer, override in json.loads(raw).items():
+            limits.setdefault(retailer, {'rate': 1.0, 'burst': 1}).update(override)
+    return limits
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Hashable, Optional
+
+
+class ResultCache:
+    """Latest check result per target, so a manual check right after another one doesn't fetch again
+
+    Each caller says how old a result it will accept. Entries older than
+    `max_age` are useless to everyone and are dropped; past `max_entries` the
+    least recently used go first.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_age: float = 3600):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, max_age: float) -> Optional[Dict]:
+        """A copy of the target's result, marked as cached with when it was fetched, if it is at most `max_age` seconds old"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.max_age:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None or now - entry[0] > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1], cached=True, cache_age=round(now - entry[0], 1), checked_at=entry[2])
+
+    def put(self, key: Hashable, result: Dict):
+        """Remember a fresh result; errors aren't kept, so the next caller tries again"""
+        with self._lock:
+            if result.get('error') or result.get('cached'):
+                return
+            self._entries[key] = (time.monotonic(), result, datetime.now().isoformat())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def forget(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
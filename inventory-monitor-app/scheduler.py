@@ -0,0 +1,252 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from metrics import CHECK_LAG_BUCKETS, Histogram
+
+
+def chain_future(future: Future, fn: Callable[[Any], Any]) -> Future:
+    """Future for fn(result) once `future` resolves, without blocking a thread on it"""
+    chained = Future()
+
+    def done(f):
+        try:
+            chained.set_result(fn(f.result()))
+        except Exception as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(done)
+    return chained
+
+
+class CheckScheduler:
+    """Runs periodic checks from one priority queue of due times and a fixed-size worker pool
+
+    run_check(key, lag) either does the check inline or returns a Future; in the
+    latter case the worker is released straight away and the job is rescheduled
+    when the future resolves, so async backends aren't capped by the pool size.
+    A number returned (or resolved) instead is the delay before the next run,
+    overriding the job's interval once. A check that raises is retried after
+    error_delay, doubling with each consecutive failure up to max_error_delay.
+    """
+
+    def __init__(self, run_check: Callable[[Hashable, float], Any], max_workers: int = 8,
+                 error_delay: float = 60, max_error_delay: float = 3600, lag_window: int = 1000):
+        self.run_check = run_check
+        self.max_workers = max_workers
+        self.error_delay = error_delay
+        self.max_error_delay = max_error_delay
+
+        # Heap entries are (due, seq, key); an entry is stale once its seq no longer
+        # matches the job's current seq, which lets us reschedule without searching the heap
+        self._heap: List = []
+        self._jobs: Dict[Hashable, Dict] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self._lags = deque(maxlen=lag_window)
+        self.lag_histogram = Histogram('inventory_check_lag_seconds', 'How late scheduled checks started after their due time',
+                                       buckets=CHECK_LAG_BUCKETS)
+        self.checks_run = 0
+        self.checks_failed = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        """Start the timer thread and the worker pool"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='check-worker')
+            self._thread = threading.Thread(target=self._loop, name='check-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop dispatching checks and shut the worker pool down"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def schedule(self, key: Hashable, interval: float, delay: float = 0.0):
+        """Add a job (or replace its timing) so it first runs after `delay` seconds"""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                job = {'interval': interval, 'running': False, 'seq': None, 'due': None, 'last_run': None, 'failures': 0}
+                self._jobs[key] = job
+            job['interval'] = interval
+            if not job['running']:
+                self._push(key, job, time.monotonic() + delay)
+
+    def reschedule(self, key: Hashable, interval: float):
+        """Change a job's interval and move its next run to match the new interval"""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job['interval'] = interval
+            if job['running']:
+                # A running job picks the new interval up when it finishes
+                return
+            now = time.monotonic()
+            if job['last_run'] is None:
+                # A first check held back (warm start, import spread) may be further off than the new interval
+                if job['due'] is not None and job['due'] > now + interval:
+                    self._push(key, job, now + interval)
+                return
+            self._push(key, job, max(now, job['last_run'] + interval))
+
+    def unschedule(self, key: Hashable):
+        """Remove a job; a check already in flight finishes but is not rescheduled"""
+        with self._cond:
+            self._jobs.pop(key, None)
+            self._cond.notify()
+
+    def take_due(self, ahead: float, accept: Callable[[Hashable], bool], limit: int) -> List[Hashable]:
+        """Claim up to `limit` idle jobs due within `ahead` of their interval, to run now alongside another check
+
+        A claimed job counts as running until finish() reports how it went. Nothing
+        is claimed while the scheduler isn't running.
+        """
+        now = time.monotonic()
+        taken = []
+        with self._cond:
+            # A scheduler that was never started (a worker that isn't running checks) has nothing to hand out
+            if not self._running:
+                return taken
+            for key, job in self._jobs.items():
+                if len(taken) >= limit:
+                    break
+                if job['running'] or job['due'] is None or job['due'] > now + ahead * job['interval']:
+                    continue
+                if accept(key):
+                    job['running'] = True
+                    job['last_run'] = now
+                    taken.append(key)
+        return taken
+
+    def finish(self, key: Hashable, error: Optional[BaseException] = None, delay: Optional[float] = None):
+        """Reschedule a job claimed with take_due() once its check is done"""
+        with self._cond:
+            job = self._jobs.get(key)
+        if job is not None and job['running']:
+            self._finish(key, job, error, delay)
+
+    def is_scheduled(self, key: Hashable) -> bool:
+        with self._cond:
+            return key in self._jobs
+
+    def jobs(self) -> Dict[Hashable, Dict]:
+        """A copy of every job's state: interval, running, due and last_run (monotonic seconds), failures"""
+        with self._cond:
+            return {key: {name: value for name, value in job.items() if name != 'seq'} for key, job in self._jobs.items()}
+
+    def stats(self) -> Dict:
+        """Scheduling counters and how late checks ran against their due time"""
+        with self._cond:
+            lags = sorted(self._lags)
+            running = sum(1 for job in self._jobs.values() if job['running'])
+            scheduled = len(self._jobs)
+
+        def percentile(p):
+            if not lags:
+                return 0.0
+            return round(lags[min(len(lags) - 1, int(p * len(lags)))], 3)
+
+        return {
+            'scheduled': scheduled,
+            'running': running,
+            'workers': self.max_workers,
+            'checks_run': self.checks_run,
+            'checks_failed': self.checks_failed,
+            'lag_seconds': {
+                'avg': round(sum(lags) / len(lags), 3) if lags else 0.0,
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'max': round(self.max_lag, 3)
+            }
+        }
+
+    def _push(self, key: Hashable, job: Dict, due: float):
+        job['seq'] = next(self._seq)
+        job['due'] = due
+        heapq.heappush(self._heap, (due, job['seq'], key))
+        self._cond.notify()
+
+    def _is_current(self, seq: int, key: Hashable) -> bool:
+        job = self._jobs.get(key)
+        return job is not None and job['seq'] == seq and not job['running']
+
+    def _loop(self):
+        with self._cond:
+            while self._running:
+                while self._heap and not self._is_current(self._heap[0][1], self._heap[0][2]):
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                due, seq, key = self._heap[0]
+                wait_time = due - time.monotonic()
+                if wait_time > 0:
+                    self._cond.wait(timeout=wait_time)
+                    continue
+
+                heapq.heappop(self._heap)
+                job = self._jobs[key]
+                job['running'] = True
+                self._executor.submit(self._execute, key, job, due)
+
+    def _execute(self, key: Hashable, job: Dict, due: float):
+        started = time.monotonic()
+        lag = max(0.0, started - due)
+
+        with self._cond:
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            job['last_run'] = started
+        self.lag_histogram.observe(lag)
+
+        try:
+            outcome = self.run_check(key, lag)
+        except Exception as e:
+            self._finish(key, job, e)
+            return
+
+        if isinstance(outcome, Future):
+            outcome.add_done_callback(
+                lambda f: self._finish(key, job, f.exception(), None if f.exception() else f.result()))
+        else:
+            self._finish(key, job, None, outcome)
+
+    def _finish(self, key: Hashable, job: Dict, error: Optional[BaseException], delay: Optional[float] = None):
+        if error is not None:
+            print(f"Error running scheduled check {key}: {error}")
+
+        with self._cond:
+            self.checks_run += 1
+            if error is not None:
+                self.checks_failed += 1
+            job['running'] = False
+            if error is not None:
+                job['failures'] += 1
+                ceiling = min(self.max_error_delay, self.error_delay * 2 ** (job['failures'] - 1))
+                # Jittered so targets that failed together don't all retry together
+                delay = random.uniform(ceiling / 2, ceiling)
+            else:
+                job['failures'] = 0
+                if not isinstance(delay, (int, float)):
+                    delay = job['interval']
+            if self._running and self._jobs.get(key) is job:
+                self._push(key, job, time.monotonic() + delay)
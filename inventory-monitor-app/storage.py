@@ -0,0 +1,249 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS monitors (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deleted (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+'''
+
+
+class MonitorDatabase:
+    """SQLite (WAL) copy of the monitors and notifications, so a restart picks up where it left off
+
+    Writes are queued and a background thread commits them in batches: an item
+    checked many times between two flushes is written once, with its latest
+    state, and a whole batch costs one transaction.
+
+    With `origin` set, every batch also appends its writes to a change log that
+    other processes sharing the file replay to keep their own copy current;
+    the newest `change_log` entries are kept. Deleted ids are remembered, and a
+    save arriving for one afterwards (say, another process's check that ran
+    before it heard of the delete) is dropped rather than bringing it back.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, max_batch: int = 500,
+                 origin: Optional[str] = None, change_log: int = 10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.origin = origin
+        self.change_log = change_log
+        self._queue: queue.Queue = queue.Queue()
+        self._stopped = threading.Event()
+        self.batches = 0
+        self.rows_written = 0
+        self.writes_merged = 0
+        self.saves_dropped = 0
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name='monitor-db', daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # Readers don't block the writer and a commit doesn't wait for a full fsync
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def save_item(self, item: Dict):
+        self._queue.put(('item', item))
+
+    def delete_item(self, item_id: int, version: int):
+        self._queue.put(('delete', (item_id, version)))
+
+    def save_notification(self, notification: Dict):
+        self._queue.put(('notification', notification))
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Block until everything queued so far is committed"""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self._stopped.set()
+        self._queue.put(('stop', None))
+        self._thread.join(timeout=10)
+
+    def _run(self):
+        conn = self._connect()
+        while not self._stopped.is_set():
+            batch = [self._queue.get()]
+            # Let a burst of updates pile up so it goes out as one transaction
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and batch[-1][0] not in ('flush', 'stop'):
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+            except sqlite3.Error as e:
+                print(f"Error saving monitors: {e}")
+            for kind, payload in batch:
+                if kind == 'flush':
+                    payload.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List):
+        # Only the last write of each item in the batch matters
+        items: Dict[int, Optional[Dict]] = {}
+        notifications = []
+        version = 0
+        deletes = []
+        for kind, payload in batch:
+            if kind == 'item':
+                if payload['id'] in items:
+                    self.writes_merged += 1
+                # Ids are never reused, so nothing may save an item once it's deleted
+                if items.get(payload['id'], {}) is not None:
+                    items[payload['id']] = payload
+                version = max(version, payload.get('version', 0))
+            elif kind == 'delete':
+                items[payload[0]] = None
+                deletes.append(payload)
+                version = max(version, payload[1])
+            elif kind == 'notification':
+                notifications.append(payload)
+
+        saved_ids = [item_id for item_id, item in items.items() if item is not None]
+        for item_id in self._deleted(conn, saved_ids):
+            del items[item_id]
+            self.saves_dropped += 1
+
+        if not items and not notifications:
+            return
+
+        with conn:
+            saved = [(item_id, json.dumps(item)) for item_id, item in items.items() if item is not None]
+            deleted = [(item_id,) for item_id, item in items.items() if item is None]
+            conn.executemany('INSERT OR REPLACE INTO monitors (id, data) VALUES (?, ?)', saved)
+            conn.executemany('DELETE FROM monitors WHERE id = ?', deleted)
+            conn.executemany('INSERT OR REPLACE INTO deleted (id, version) VALUES (?, ?)', deletes)
+            conn.executemany('INSERT INTO notifications (data) VALUES (?)',
+                             [(json.dumps(notification),) for notification in notifications])
+            if self.origin is not None:
+                self._log_changes(conn, items, notifications)
+            # Neither counter may go backwards, even once the rows that set them are deleted
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), excluded.value)",
+                             [('version', version), ('last_id', max(items, default=0))])
+        self.batches += 1
+        self.rows_written += len(items) + len(notifications)
+
+    def _deleted(self, conn: sqlite3.Connection, item_ids: List[int]) -> List[int]:
+        """Which of these ids were deleted, by this process or another"""
+        found = []
+        for start in range(0, len(item_ids), 500):
+            chunk = item_ids[start:start + 500]
+            rows = conn.execute(f"SELECT id FROM deleted WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            found.extend(item_id for item_id, in rows)
+        return found
+
+    def _log_changes(self, conn: sqlite3.Connection, items: Dict[int, Optional[Dict]], notifications: List[Dict]):
+        changes = [('item', json.dumps(item)) if item is not None else ('delete', json.dumps({'id': item_id}))
+                   for item_id, item in items.items()]
+        changes += [('notification', json.dumps(notification)) for notification in notifications]
+        conn.executemany('INSERT INTO changes (origin, kind, data) VALUES (?, ?, ?)',
+                         [(self.origin, kind, data) for kind, data in changes])
+        conn.execute('DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?', (self.change_log,))
+
+    def allocate_id(self) -> int:
+        """Next item id, unique across every process sharing the file"""
+        return self.allocate_ids(1)
+
+    def allocate_ids(self, count: int) -> int:
+        """First of `count` consecutive item ids, reserved in one transaction"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("INSERT INTO meta (key, value) VALUES ('last_id', ?) "
+                             "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ?", (count, count))
+                return int(conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()[0]) - count + 1
+        finally:
+            conn.close()
+
+    def changes_since(self, seq: int, limit: int = 1000) -> Tuple[List[Tuple[int, str, str, Dict]], bool]:
+        """Logged changes after `seq` as (seq, origin, kind, data), and whether any were already pruned"""
+        conn = self._connect()
+        try:
+            oldest = conn.execute('SELECT MIN(seq) FROM changes').fetchone()[0]
+            rows = conn.execute('SELECT seq, origin, kind, data FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+                                (seq, limit)).fetchall()
+            return [(row_seq, origin, kind, json.loads(data)) for row_seq, origin, kind, data in rows], \
+                oldest is not None and oldest > seq + 1
+        finally:
+            conn.close()
+
+    def last_change(self) -> int:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def load_items(self) -> List[Dict]:
+        conn = self._connect()
+        try:
+            return [json.loads(data) for data, in conn.execute('SELECT data FROM monitors ORDER BY id')]
+        finally:
+            conn.close()
+
+    def load_notifications(self, limit: int) -> List[Dict]:
+        """The most recent notifications, newest first"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT data FROM notifications ORDER BY seq DESC LIMIT ?', (limit,))
+            return [json.loads(data) for data, in rows]
+        finally:
+            conn.close()
+
+    def load_counter(self, key: str) -> int:
+        """Highest list version ('version') or item id ('last_id') ever saved"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+            return int(row[0]) if row else 0
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'writes_merged': self.writes_merged,
+            'saves_dropped': self.saves_dropped,
+            'shared': self.origin is not None
+        }
@@ -0,0 +1,180 @@
+import csv
+import functools
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    """Point on the unit sphere; straight-line distance between two grows with their great-circle distance"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def normalize_zip(zip_code) -> Optional[str]:
+    """The five-digit ZIP at the start of a ZIP or ZIP+4, or None if it isn't one"""
+    zip_code = str(zip_code or '').strip()[:5]
+    return zip_code if len(zip_code) == 5 and zip_code.isdigit() else None
+
+
+def chord_for_miles(miles: float) -> float:
+    """Straight-line distance on the unit sphere matching a great-circle distance in miles"""
+    return 2 * math.sin(min(math.pi, miles / EARTH_RADIUS_MILES) / 2)
+
+
+def miles_for_chord(chord: float) -> float:
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """Static 3-d tree over unit-sphere points for radius queries
+
+    Built once from a list of points by median splits; nodes live in flat
+    lists so a query is a short loop over indexes rather than object hops.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float, float]]):
+        self.points = list(points)
+        self._point: List[int] = []
+        self._axis: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self.root = self._build(list(range(len(self.points))), 0)
+
+    def _build(self, indexes: List[int], depth: int) -> int:
+        if not indexes:
+            return -1
+        axis = depth % 3
+        indexes.sort(key=lambda i: self.points[i][axis])
+        middle = len(indexes) // 2
+        node = len(self._point)
+        self._point.append(indexes[middle])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(indexes[:middle], depth + 1)
+        self._right[node] = self._build(indexes[middle + 1:], depth + 1)
+        return node
+
+    def within(self, center: Tuple[float, float, float], radius: float) -> List[Tuple[float, int]]:
+        """(distance, point index) for every point within `radius` of `center`"""
+        found = []
+        limit = radius * radius
+        stack = [self.root] if self.root != -1 else []
+        points = self.points
+        while stack:
+            node = stack.pop()
+            index = self._point[node]
+            point = points[index]
+            dx, dy, dz = point[0] - center[0], point[1] - center[1], point[2] - center[2]
+            squared = dx * dx + dy * dy + dz * dz
+            if squared <= limit:
+                found.append((math.sqrt(squared), index))
+
+            offset = center[self._axis[node]] - point[self._axis[node]]
+            near, far = (self._left[node], self._right[node]) if offset <= 0 else (self._right[node], self._left[node])
+            if near != -1:
+                stack.append(near)
+            # The far side can only hold matches if the splitting plane is within reach
+            if far != -1 and offset * offset <= limit:
+                stack.append(far)
+        return found
+
+
+class StoreLocator:
+    """Stores near a ZIP code, from bundled store and ZIP centroid files
+
+    Each retailer's stores go into their own KD-tree once at load. A ZIP missing
+    from the centroid file falls back to the average of the listed ZIPs sharing
+    its first three digits (the same sectional center). Results for a
+    retailer/ZIP/radius are memoized, since the same searches repeat.
+    """
+
+    def __init__(self, stores: List[Dict], zip_centroids: Dict[str, Tuple[float, float]], cache_size: int = 4096):
+        self.zip_centroids = zip_centroids
+        prefixes: Dict[str, List[Tuple[float, float]]] = {}
+        for zip_code, centroid in zip_centroids.items():
+            prefixes.setdefault(zip_code[:3], []).append(centroid)
+        self.prefix_centroids = {
+            prefix: (sum(lat for lat, _ in centroids) / len(centroids), sum(lon for _, lon in centroids) / len(centroids))
+            for prefix, centroids in prefixes.items()
+        }
+
+        by_retailer: Dict[str, List[Dict]] = {}
+        for store in stores:
+            by_retailer.setdefault(store['retailer'], []).append(store)
+        self.stores = by_retailer
+        self.trees = {
+            retailer: KDTree([to_unit_vector(store['lat'], store['lon']) for store in retailer_stores])
+            for retailer, retailer_stores in by_retailer.items()
+        }
+        self._search = functools.lru_cache(maxsize=cache_size)(self._search_uncached)
+
+    @classmethod
+    def from_files(cls, stores_path: str = os.path.join(DATA_DIR, 'stores.csv'),
+                   zips_path: str = os.path.join(DATA_DIR, 'zip_centroids.csv')) -> 'StoreLocator':
+        with open(stores_path, newline='') as f:
+            # Rows with sample=1 are made-up demonstration stores, not real locations
+            stores = [dict(row, lat=float(row['lat']), lon=float(row['lon']), sample=row.get('sample') == '1')
+                      for row in csv.DictReader(f)]
+        with open(zips_path, newline='') as f:
+            zip_centroids = {row['zip'].zfill(5): (float(row['lat']), float(row['lon'])) for row in csv.DictReader(f)}
+        return cls(stores, zip_centroids)
+
+    def locate_zip(self, zip_code: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) for a ZIP code, or None if neither it nor its 3-digit prefix is known"""
+        zip_code = normalize_zip(zip_code)
+        if zip_code is None:
+            return None
+        return self.zip_centroids.get(zip_code) or self.prefix_centroids.get(zip_code[:3])
+
+    def _search_uncached(self, retailer: str, zip_code: str, radius: float) -> Tuple[Dict, ...]:
+        center = self.locate_zip(zip_code)
+        tree = self.trees.get(retailer)
+        if center is None or tree is None:
+            return ()
+        matches = sorted(tree.within(to_unit_vector(*center), chord_for_miles(radius)))
+        stores = self.stores[retailer]
+        return tuple(
+            {
+                'store_id': stores[index]['store_id'],
+                'name': stores[index]['name'],
+                'address': f"{stores[index]['address']}, {stores[index]['city']}, {stores[index]['state']} {stores[index]['zip']}",
+                'distance': round(miles_for_chord(chord), 1),
+                'sample': bool(stores[index].get('sample'))
+            }
+            for chord, index in matches
+        )
+
+    def nearby(self, retailer: str, zip_code: str, radius: float) -> List[Dict]:
+        """A retailer's stores within `radius` miles of a ZIP code, nearest first"""
+        return [dict(store) for store in self._search(retailer, normalize_zip(zip_code) or '', float(radius))]
+
+    def stats(self) -> Dict:
+        info = self._search.cache_info()
+        return {
+            'stores': sum(len(stores) for stores in self.stores.values()),
+            'sample_stores': sum(1 for stores in self.stores.values() for store in stores if store.get('sample')),
+            'zip_codes': len(self.zip_centroids),
+            'cache_hits': info.hits,
+            'cache_misses': info.misses,
+            'cached_searches': info.currsize
+        }
+
+
+_default_locator: Optional[StoreLocator] = None
+_default_lock = threading.Lock()
+
+
+def default_store_locator() -> StoreLocator:
+    """The locator over the bundled data files, loaded on first use and shared by the process"""
+    global _default_locator
+    with _default_lock:
+        if _default_locator is None:
+            _default_locator = StoreLocator.from_files()
+        return _default_locator
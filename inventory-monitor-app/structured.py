@@ -0,0 +1,253 @@
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Markers of the embedded product data blocks, checked in document order
+SCRIPT_MARKERS = (
+    ('application/ld+json', 'json-ld'),
+    ('__NEXT_DATA__', 'next-data')
+)
+
+# schema.org availability values (and framework-state enums) that mean buyable now
+IN_STOCK_VALUES = {
+    'instock', 'in_stock', 'limitedavailability', 'limited_stock', 'onlineonly', 'instoreonly', 'available'
+}
+
+# Keys that hold an availability value in framework state (__NEXT_DATA__)
+AVAILABILITY_KEYS = ('availabilityStatus', 'availability_status', 'availability')
+
+# How deep to search framework state for the product; it sits a handful of levels down
+MAX_STATE_DEPTH = 12
+
+# Longest tag prefix kept between streamed chunks while looking for a marker
+MARKER_CARRY = 512
+
+
+def _to_price(value: Any) -> Optional[float]:
+    try:
+        price = float(str(value).replace('$', '').replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+def _normalize_availability(value: Any) -> Optional[bool]:
+    if not isinstance(value, str) or not value:
+        return None
+    # schema.org values arrive as URLs ("https://schema.org/InStock") or bare names
+    return value.rstrip('/').rsplit('/', 1)[-1].lower() in IN_STOCK_VALUES
+
+
+def _iter_json_ld_products(data: Any) -> Iterator[Dict]:
+    if isinstance(data, list):
+        for entry in data:
+            yield from _iter_json_ld_products(entry)
+    elif isinstance(data, dict):
+        if '@graph' in data:
+            yield from _iter_json_ld_products(data['@graph'])
+        types = data.get('@type')
+        types = types if isinstance(types, list) else [types]
+        if 'Product' in types or 'ProductGroup' in types:
+            yield data
+
+
+def _iter_offers(offers: Any) -> Iterator[Dict]:
+    if isinstance(offers, list):
+        for offer in offers:
+            yield from _iter_offers(offer)
+    elif isinstance(offers, dict):
+        # AggregateOffer wraps the individual offers
+        if 'offers' in offers:
+            yield from _iter_offers(offers['offers'])
+        yield offers
+
+
+def extract_json_ld(data: Any) -> Optional[Tuple[bool, Optional[float]]]:
+    """(in_stock, price) from a JSON-LD Product, or None if the block isn't one"""
+    for product in _iter_json_ld_products(data):
+        in_stock = None
+        price = None
+        for offer in _iter_offers(product.get('offers')):
+            availability = _normalize_availability(offer.get('availability'))
+            if availability is not None:
+                in_stock = bool(in_stock) or availability
+            if price is None:
+                price = _to_price(offer.get('price', offer.get('lowPrice')))
+        if in_stock is not None:
+            return in_stock, price
+    return None
+
+
+def _state_price(node: Dict) -> Optional[float]:
+    current = node.get('currentPrice')
+    if isinstance(current, dict):
+        return _to_price(current.get('price'))
+    if 'current_retail' in node:
+        return _to_price(node['current_retail'])
+    if isinstance(node.get('price'), (int, float, str)):
+        return _to_price(node['price'])
+    return None
+
+
+def extract_next_data(data: Any) -> Optional[Tuple[bool, Optional[float]]]:
+    """(in_stock, price) from framework page state, searched breadth-first for the shallowest product"""
+    in_stock = None
+    price = None
+    queue = deque([(data, 0)])
+    while queue and (in_stock is None or price is None):
+        node, depth = queue.popleft()
+        if isinstance(node, dict):
+            if in_stock is None:
+                for key in AVAILABILITY_KEYS:
+                    availability = _normalize_availability(node.get(key))
+                    if availability is not None:
+                        in_stock = availability
+                        break
+            if price is None:
+                price = _state_price(node)
+            children = node.values()
+        elif isinstance(node, list):
+            children = node
+        else:
+            continue
+        if depth < MAX_STATE_DEPTH:
+            queue.extend((child, depth + 1) for child in children if isinstance(child, (dict, list)))
+
+    if in_stock is None:
+        return None
+    return in_stock, price
+
+
+def decode_block(path: str, text: str) -> Optional[Tuple[bool, Optional[float]]]:
+    """Decode one embedded block and pull the product's stock and price out of it"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if path == 'json-ld':
+        return extract_json_ld(data)
+    return extract_next_data(data)
+
+
+def _next_marker(html: str, start: int) -> Tuple[int, Optional[str], Optional[str]]:
+    best = (-1, None, None)
+    for marker, path in SCRIPT_MARKERS:
+        pos = html.find(marker, start)
+        if pos != -1 and (best[0] == -1 or pos < best[0]):
+            best = (pos, marker, path)
+    return best
+
+
+def _tag_bounds(html: str, pos: int) -> Tuple[int, int]:
+    """Start and end of the <script> tag containing the marker at pos, or (-1, -1)"""
+    tag_start = html.rfind('<script', max(0, pos - MARKER_CARRY), pos)
+    if tag_start == -1 or html.find('>', tag_start, pos) != -1:
+        # The marker isn't inside a script tag's attributes
+        return -1, -1
+    return tag_start, html.find('>', pos)
+
+
+def _iter_blocks(html: str) -> Iterator[Tuple[str, str]]:
+    """(path, text) of each embedded data block, in document order"""
+    pos, marker, path = _next_marker(html, 0)
+    while pos != -1:
+        tag_start, tag_end = _tag_bounds(html, pos)
+        if tag_start == -1 or tag_end == -1:
+            pos, marker, path = _next_marker(html, pos + 1)
+            continue
+
+        body_end = html.find('</script>', tag_end)
+        if body_end == -1:
+            return
+
+        yield path, html[tag_end + 1:body_end]
+        pos, marker, path = _next_marker(html, body_end)
+
+
+def find_structured(html: str) -> Optional[Tuple[bool, Optional[float], str, int]]:
+    """(in_stock, price, path, blocks read) from the first embedded product block, or None
+
+    Only the blocks' own slices of the page are decoded; the rest of the HTML is
+    never parsed. The result depends on nothing but the first `blocks read` of
+    embedded_blocks().
+    """
+    for count, (path, text) in enumerate(_iter_blocks(html), 1):
+        extracted = decode_block(path, text)
+        if extracted is not None:
+            return extracted[0], extracted[1], path, count
+    return None
+
+
+def embedded_blocks(body: bytes) -> List[bytes]:
+    """Raw bytes of each embedded data block of an undecoded page, the same blocks find_structured() reads
+
+    Latin-1 maps every byte to one character, so the ASCII markers and tags sit
+    at the same places as in the page decoded with any ASCII-compatible charset.
+    """
+    return [text.encode('latin-1') for _, text in _iter_blocks(body.decode('latin-1'))]
+
+
+class StructuredStreamScanner:
+    """find_structured() for a page that arrives in chunks"""
+
+    def __init__(self):
+        self.result: Optional[Tuple[bool, Optional[float], str]] = None
+        self._pending = ''
+        self._block: Optional[str] = None
+        self._block_path: Optional[str] = None
+
+    def feed(self, text: str):
+        if self.result is not None:
+            return
+        buffer = self._pending + text
+        self._pending = ''
+
+        while buffer:
+            if self._block is None:
+                pos, marker, path = _next_marker(buffer, 0)
+                if pos == -1:
+                    self._pending = buffer[-MARKER_CARRY:]
+                    return
+                tag_start, tag_end = _tag_bounds(buffer, pos)
+                if tag_start == -1:
+                    buffer = buffer[pos + 1:]
+                    continue
+                if tag_end == -1:
+                    # The tag's closing '>' hasn't arrived yet
+                    self._pending = buffer[tag_start:]
+                    return
+                self._block = ''
+                self._block_path = path
+                buffer = buffer[tag_end + 1:]
+                continue
+
+            search_from = max(0, len(self._block) - len('</script>'))
+            self._block += buffer
+            body_end = self._block.find('</script>', search_from)
+            if body_end == -1:
+                return
+
+            buffer = self._block[body_end:]
+            extracted = decode_block(self._block_path, self._block[:body_end])
+            self._block = None
+            if extracted is not None:
+                self.result = (extracted[0], extracted[1], self._block_path)
+                return
+
+
+class ParseStats:
+    """How many parsed pages took each extraction path, per retailer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._retailers: Dict[str, Dict[str, int]] = {}
+
+    def record(self, retailer: str, path: str):
+        with self._lock:
+            paths = self._retailers.setdefault(retailer, {})
+            paths[path] = paths.get(path, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {retailer: dict(paths) for retailer, paths in self._retailers.items()}